@@ -78,7 +78,8 @@ class Gala_Alex(Adv):
             if no_autocharge and hasattr(s, 'autocharge_timer'):
                 continue
             s.charge(self.sp_convert(percent, s.sp))
-        log('sp', name if not target else f'{name}->{target}', f'{percent*100:.0f}%', f'{self.sr.charged}/{self.sr.sp} ({self.sr.count}), {self.s3.charged}/{self.s3.sp}, {self.s4.charged}/{self.s4.sp}')
+        if self.ctx.logs.keep_record:
+            log('sp', name if not target else f'{name}->{target}', f'{percent*100:.0f}%', f'{self.sr.charged}/{self.sr.sp} ({self.sr.count}), {self.s3.charged}/{self.s3.sp}, {self.s4.charged}/{self.s4.sp}')
         self.think_pin('prep')
 
     def charge(self, name, sp, target=None):
@@ -88,7 +89,8 @@ class Gala_Alex(Adv):
             return
         for s in targets:
             s.charge(sp)
-        log('sp', name, sp, f'{self.sr.charged}/{self.sr.sp} ({self.sr.count}), {self.s3.charged}/{self.s3.sp}, {self.s4.charged}/{self.s4.sp}')
+        if self.ctx.logs.keep_record:
+            log('sp', name, sp, f'{self.sr.charged}/{self.sr.sp} ({self.sr.count}), {self.s3.charged}/{self.s3.sp}, {self.s4.charged}/{self.s4.sp}')
         self.think_pin('sp')
 
 class Gala_Alex_BK(Gala_Alex):
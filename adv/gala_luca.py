@@ -24,7 +24,8 @@ class Gala_Luca(Adv):
 
     def buff_icon_count(self):
         # not accurate to game
-        icons = [b.name for b in self.all_buffs if b.get() and not b.hidden and b.bufftype == 'self' or b.bufftype == 'team']
+        buffs = self.buff_index.scan(chain(self.buff_index.by_bufftype('self'), self.buff_index.by_bufftype('team', stored=True)))
+        icons = [b.name for b in buffs if b.get() and not b.hidden and b.bufftype == 'self' or b.bufftype == 'team']
         icon_count = len(set(icons))
         if self.conf['sim_buffbot.count'] is not None:
             icon_count += self.conf.sim_buffbot.count
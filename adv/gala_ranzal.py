@@ -15,7 +15,8 @@ class Gala_Ranzal(Adv):
 
     def charge_gauge(self, source, name):
         self.gauges[source] = min(self.gauges[source] + gauge_values[name], 1000)
-        log('gauges', name, f'{self.gauges["x"]}/1000', f'{self.gauges["fs"]}/1000')
+        if self.ctx.logs.keep_record:
+            log('gauges', name, f'{self.gauges["x"]}/1000', f'{self.gauges["fs"]}/1000')
 
     def x_proc(self, e):
         self.charge_gauge('x', e.name)
@@ -12,7 +12,7 @@ class Laxi(Adv):
             self.healed = 1
             self.set_hp(100)
             self.heal()
-            for buff in self.all_buffs:
+            for buff in self.all_buffs.copy():
                 if buff.source != 'ability':
                     buff.off()
 
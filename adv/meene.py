@@ -14,7 +14,8 @@ class Meene(Adv):
     def a1_push_to_act_history(self, e):
         self.a1_check_delayed()
         self.act_history.append(e.name)
-        log('act_history', str(self.act_history))
+        if self.ctx.logs.keep_record:
+            log('act_history', str(self.act_history))
         if len(self.act_history) > 5:
             oldest = self.act_history.popleft()
             self.a1_clear_oldest_butterflies(oldest)
@@ -36,9 +37,9 @@ class Meene(Adv):
             self.butterfly_timers[(now(), e.name, t.chaser)].add(t)
             log('butterflies', 'spawn', self.butterflies)
             if mt:
-                self.cancelable.add((mt, (now(), e.name, t.chaser)))
+                self.cancelable.add((mt.keep(), (now(), e.name, t.chaser)))
         elif mt and attr.get('chaser'):
-            self.butterfly_timers[(now(), e.name, attr.get('chaser'))].add(mt)
+            self.butterfly_timers[(now(), e.name, attr.get('chaser'))].add(mt.keep())
         while self.butterflies > 9:
             oldest = next(iter(sorted(self.butterfly_timers.keys())))
             for t in self.butterfly_timers[oldest]:
@@ -86,7 +87,8 @@ class Meene(Adv):
         if self.butterflies < 6:
             self.current_s['s1'] = 'default'
             self.current_s['s2'] = 'default'
-        log('butterflies', f'remove {name}', self.butterflies)
+        if self.ctx.logs.keep_record:
+            log('butterflies', f'remove {name}', self.butterflies)
 
     def a1_clear_butterflies(self, name, chaser, start, reason='timeout'):
         try:
@@ -97,7 +99,8 @@ class Meene(Adv):
             if self.butterflies < 6:
                 self.current_s['s1'] = 'default'
                 self.current_s['s2'] = 'default'
-            log('butterflies', f'{reason} {name}-{chaser}', self.butterflies)
+            if self.ctx.logs.keep_record:
+                log('butterflies', f'{reason} {name}-{chaser}', self.butterflies)
         except KeyError:
             pass
 
@@ -55,7 +55,8 @@ class Mega_Man(Adv):
             if s.c_ammo <= 0:
                 self.current_x = 'default'
         if ammo != 0:
-            log('ammo', name, ammo, ' '.join(f'{s.c_ammo}/{s.ammo}' for s in (self.s1, self.s2)))
+            if self.ctx.logs.keep_record:
+                log('ammo', name, ammo, ' '.join(f'{s.c_ammo}/{s.ammo}' for s in (self.s1, self.s2)))
         super().hitattr_make(name, base, group, aseq, attr, onhit=None)
 
     def s1_proc(self, e):
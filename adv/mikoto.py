@@ -18,7 +18,8 @@ class Mikoto(RngCritAdv):
             else:
                 s.charge(sp)
         self.think_pin('sp')
-        log('sp', name if not target else f'{name}_{target}', sp, ', '.join([f'{s.charged}/{s.sp}' for s in self.skills]))
+        if self.ctx.logs.keep_record:
+            log('sp', name if not target else f'{name}_{target}', sp, ', '.join([f'{s.charged}/{s.sp}' for s in self.skills]))
 
     def rngcrit_cb(self, mrate=None):
         self.a1_stack = mrate
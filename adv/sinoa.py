@@ -45,7 +45,7 @@ class Sinoa(Adv):
     def s1_proc(self, e):
         if e.name != 's1':
             # use RNG variant when shared
-            return Teambuff(e.name, *random.choice((
+            return Teambuff(e.name, *self.ctx.rng.choice((
                 (0.25, 15.0, 'att', 'buff'),
                 (0.25, 15.0, 'defense', 'buff'),
                 (0.25, 10.0, 'crit', 'chance'),
@@ -115,19 +115,19 @@ class Sinoa(Adv):
     def buffcount(self):
         return super().buffcount + self.s1_buffcount
 
-    def dmg_formula(self, name, dmg_coef):
+    def dmg_formula(self, name, dmg_coef, src=None):
         if self.combined_states is None or name == 'test':
-            return super().dmg_formula(name, dmg_coef)
+            return super().dmg_formula(name, dmg_coef, src)
         m_dmg = 0
         for state, state_p in self.combined_states.items():
             if state[0] == 0 and state[2] == 0:
-                m_dmg += state_p * super().dmg_formula(name, dmg_coef)
+                m_dmg += state_p * super().dmg_formula(name, dmg_coef, src)
                 continue
             state_mods = [
                 Modifier('sinoa_att', 'att', 'buff', 0.25 * state[0]),
                 Modifier('sinoa_crit', 'crit', 'chance', 0.25 * state[2]),
             ]
-            m_dmg += state_p * super().dmg_formula(name, dmg_coef)
+            m_dmg += state_p * super().dmg_formula(name, dmg_coef, src)
             for m in state_mods:
                 m.off()
         return m_dmg
@@ -140,7 +140,7 @@ class Sinoa(Adv):
         self.dmg_test_event.modifiers = ModifierDict()
         for mod in base_mods:
             self.dmg_test_event.modifiers.append(mod)
-        for b in filter(lambda b: b.get() and b.bufftype == 'simulated_def', self.all_buffs):
+        for b in filter(lambda b: b.get() and b.bufftype == 'simulated_def', self.buff_index.scan(self.buff_index.by_bufftype('simulated_def'))):
             self.dmg_test_event.modifiers.append(b.modifier)
 
         self.dmg_test_event()
@@ -149,7 +149,7 @@ class Sinoa(Adv):
         for mod in state_mods:
             self.dmg_test_event.modifiers.append(mod)
         placeholders = []
-        for b in filter(lambda b: b.get() and b.bufftype in ('team', 'debuff'), self.all_buffs):
+        for b in filter(lambda b: b.get() and b.bufftype in ('team', 'debuff'), self.buff_index.scan(self.buff_index.by_bufftype('team', 'debuff'))):
             placehold = None
             if b.modifier.mod_type == 's':
                 placehold = Modifier('placehold_sd', 'att', 'sd', b.modifier.get() / 2)
@@ -177,7 +177,7 @@ class Sinoa(Adv):
 
 class Sinoa_RNG(Adv):
     def s1_proc(self, e):
-        Teambuff(e.name, *random.choice((
+        Teambuff(e.name, *self.ctx.rng.choice((
             (0.25, 15.0, 'att', 'buff'),
             (0.25, 15.0, 'defense', 'buff'),
             (0.25, 10.0, 'crit', 'chance'),
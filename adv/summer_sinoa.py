@@ -20,7 +20,8 @@ class Summer_Sinoa(Adv):
             else:
                 s.charge(sp)
         self.think_pin('sp')
-        log('sp', name if not target else f'{name}_{target}', sp, ', '.join([f'{s.charged}/{s.sp}' for s in self.skills]))
+        if self.ctx.logs.keep_record:
+            log('sp', name if not target else f'{name}_{target}', sp, ', '.join([f'{s.charged}/{s.sp}' for s in self.skills]))
 
     def s1_before(self, e):
         if self.overload == -1:
@@ -47,7 +48,7 @@ class Summer_Sinoa(Adv):
             ]
             log('debug', 'overload', self.overload)
             for _ in range(max(1, self.overload)):
-                buff = random.choice(buffs)
+                buff = self.ctx.rng.choice(buffs)
                 buff()
                 buffs.remove(buff)
         self.overload = 0
@@ -106,13 +106,13 @@ class Sylas(Adv):
     def buffcount(self):
         return super().buffcount + self.s2_buffcount
 
-    def dmg_formula(self, name, dmg_coef):
+    def dmg_formula(self, name, dmg_coef, src=None):
         if self.combined_states is None or name == 'test':
-            return super().dmg_formula(name, dmg_coef)
+            return super().dmg_formula(name, dmg_coef, src)
         m_dmg = 0
         for state, state_p in self.combined_states.items():
             with Modifier('sylas_att', 'att', 'buff', 0.25 * state[0]):
-                s_dmg = state_p * super().dmg_formula(name, dmg_coef)
+                s_dmg = state_p * super().dmg_formula(name, dmg_coef, src)
                 m_dmg += s_dmg
         return m_dmg
 
@@ -124,7 +124,7 @@ class Sylas(Adv):
         self.dmg_test_event.modifiers = ModifierDict()
         for mod in base_mods:
             self.dmg_test_event.modifiers.append(mod)
-        for b in filter(lambda b: b.get() and b.bufftype == 'simulated_def', self.all_buffs):
+        for b in filter(lambda b: b.get() and b.bufftype == 'simulated_def', self.buff_index.scan(self.buff_index.by_bufftype('simulated_def'))):
             self.dmg_test_event.modifiers.append(b.modifier)
 
         self.dmg_test_event()
@@ -133,7 +133,7 @@ class Sylas(Adv):
         for mod in state_mods:
             self.dmg_test_event.modifiers.append(mod)
         placeholders = []
-        for b in filter(lambda b: b.get() and b.bufftype in ('team', 'debuff'), self.all_buffs):
+        for b in filter(lambda b: b.get() and b.bufftype in ('team', 'debuff'), self.buff_index.scan(self.buff_index.by_bufftype('team', 'debuff'))):
             placehold = None
             if b.modifier.mod_type == 's':
                 placehold = Modifier('placehold_sd', 'att', 'sd', b.modifier.get() / 2)
@@ -171,7 +171,7 @@ class Sylas_RNG(Adv):
         ]
 
     def s2_proc(self, e):
-        pick = random.choice(self.s2_buff_args)
+        pick = self.ctx.rng.choice(self.s2_buff_args)
         if pick == 'all':
             for buffarg in self.s2_buff_args[0:3]:
                 Teambuff(e.name, *buffarg).on()
@@ -39,7 +39,7 @@ def set_teamdps_res(result, logs, real_d, suffix=''):
             result['extra' + suffix]['team_{}'.format(tension)] = '{} stacks'.format(round(count))
     return result
 
-def run_adv_test(adv_name, wp=None, dra=None, wep=None, acl=None, conf=None, cond=None, vkey=None, t=180, log=5, mass=0):
+def run_adv_test(adv_name, wp=None, dra=None, wep=None, acl=None, conf=None, cond=None, vkey=None, t=180, log=5, mass=0, acl_coverage=False):
     adv_module = ADV_MODULES[adv_name][vkey]
 
     if conf is None:
@@ -59,7 +59,7 @@ def run_adv_test(adv_name, wp=None, dra=None, wep=None, acl=None, conf=None, con
 
     fn = io.StringIO()
     try:
-        run_res = core.simulate.test(adv_name, adv_module, conf, t, log, mass, output=fn, cond=cond)
+        run_res = core.simulate.test(adv_name, adv_module, conf, t, log, mass, output=fn, cond=cond, acl_coverage=acl_coverage)
         result['test_output'] = fn.getvalue()
     except Exception as e:
         result['error'] = str(e)
@@ -67,7 +67,8 @@ def run_adv_test(adv_name, wp=None, dra=None, wep=None, acl=None, conf=None, con
 
     adv = run_res[0][0]
     real_d = run_res[0][1]
-    if vkey is None:
+    if vkey is None and not acl_coverage:
+        # equip results come from plain runs only, not ones timing every acl statement
         core.simulate.save_equip(adv, real_d)
 
     result['logs'] = {}
@@ -85,6 +86,9 @@ def run_adv_test(adv_name, wp=None, dra=None, wep=None, acl=None, conf=None, con
     result['chart'] = {}
     result['chart'] = adv.logs.convert_dataset()
 
+    if acl_coverage:
+        result['acl_coverage'] = adv._acl.coverage()
+
     return result
 
 
@@ -106,6 +110,7 @@ def simc_adv_test():
     coab = params.get('coab')
     share = params.get('share')
     vkey = params.get('variant')
+    acl_coverage = bool(params.get('acl_coverage'))
     # latency = 0 if 'latency' not in params else abs(float(params['latency']))
     # print(params, flush=True)
 
@@ -146,7 +151,8 @@ def simc_adv_test():
     result = run_adv_test(
         adv_name,
         wp=wp, dra=dra, wep=wep, acl=acl,
-        conf=conf, cond=cond, vkey=vkey, t=t, log=log, mass=mass
+        conf=conf, cond=cond, vkey=vkey, t=t, log=log, mass=mass,
+        acl_coverage=acl_coverage
     )
     return jsonify(result)
 
@@ -0,0 +1,51 @@
+"""
+Hit processing micro-benchmark: the modifiers one skill hit turns on, sums and
+turns off again, and toggling modifiers in a small and a large bucket.
+
+    python -m bench.modifier [adv=Grace] [pad=200]
+"""
+import sys
+import timeit
+
+import core.simulate
+from core.modifier import Modifier, KillerModifier, CrisisModifier
+
+
+def best_us(fn, number):
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1e6
+
+
+def main(name='Grace', n_pad=200):
+    module, name = core.simulate.load_adv_module(name)
+    adv, _ = core.simulate.run_once(name, module, {}, 180, True)
+    adv.ctx.on()
+
+    def hit():
+        hitmods = adv.actmods('s1')
+        hitmods.append(KillerModifier('s1', 'hit', 0.2, ['poisoned']))
+        hitmods.append(CrisisModifier('s1', 0.5, adv.hp))
+        hitmods.append(Modifier('s1_bufc', 'att', 'bufc', 0.05*adv.buffcount))
+        for mod in hitmods:
+            mod.on()
+        adv.dmg_formula('s', 1.0)
+        for mod in hitmods:
+            mod.off()
+
+    toggled = [Modifier(f'bench{i}', 'att', 'passive', 0.01) for i in range(4)]
+    for mod in toggled:
+        mod.off()
+
+    def toggle():
+        for mod in toggled:
+            mod.on()
+        for mod in toggled:
+            mod.off()
+
+    print(f'{name+" hit:":<32}{best_us(hit, 5000):.1f}us')
+    print(f'{"toggle 4 modifiers:":<32}{best_us(toggle, 20000):.2f}us')
+    pad = [Modifier(f'pad{i}', 'att', 'passive', 0.01) for i in range(n_pad)]
+    print(f'{f"toggle 4 next to {len(pad)} others:":<32}{best_us(toggle, 20000):.2f}us')
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:2], *map(int, sys.argv[2:3]))
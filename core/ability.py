@@ -616,8 +616,7 @@ class Affliction_Selfbuff(Ability):
         def l_afflict(e):
             if not self.is_cd:
                 if self.is_rng:
-                    import random
-                    if random.random() < e.rate:
+                    if adv.ctx.rng.random() < e.rate:
                         adv.Buff(self.name, self.value, self.duration, *self.buff_args, source=e.source).on()
                         self.is_cd = True
                         adv.Timer(cd_end).on(self.cd)
@@ -805,8 +804,7 @@ class Energy_Extra(Ability):
     def oninit(self, adv, afrom=None):
         if self.use_rng:
             def l_energy(e):
-                import random
-                if random.random() < self.value:
+                if adv.ctx.rng.random() < self.value:
                     adv.energy.add_extra(1)
         else:
             def l_energy(e):
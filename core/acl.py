@@ -1,9 +1,14 @@
 import os
 import re
+import pickle
+import hashlib
 from itertools import islice
 from collections import deque
+from functools import lru_cache
+from time import perf_counter
 
 CHAR_LIMIT = 1000
+CACHE_SIZE = 256
 
 def pairs(iterator):
     "s -> (s0,s1), (s2,s3), (s4, s5), ..."
@@ -11,23 +16,47 @@ def pairs(iterator):
     b = islice(iterator, 1, None, 2)
     return zip(a, b)
 
-from lark import Lark, Tree, Token
-from lark.visitors import Visitor, Interpreter, v_args
-
 from core.timeline import now
 from core.log import log
 from conf import ROOT_DIR
 
 froot = os.path.join(ROOT_DIR, 'core')
 lark_file = os.path.join(froot, 'acl.lark')
+parser_file = os.path.join(froot, 'acl_parser.py')
 with open(lark_file) as f:
-    PARSER = Lark(f.read(), parser='lalr')
+    GRAMMAR = f.read()
+GRAMMAR_HASH = hashlib.sha256(GRAMMAR.encode()).hexdigest()
+PARSER_HEADER = f'# acl.lark sha256: {GRAMMAR_HASH}\n'
 
 
-SHORT_CIRCUIT = {
-    'AND': lambda l: bool(not l),
-    'OR': lambda l: bool(l),
-}
+def generate_parser(path=parser_file):
+    # standalone LALR parser with pre-built tables, only this needs lark installed
+    from lark import Lark
+    from lark.tools.standalone import gen_standalone
+    tmp = f'{path}.{os.getpid()}'
+    with open(tmp, 'w') as f:
+        f.write(PARSER_HEADER)
+        gen_standalone(Lark(GRAMMAR, parser='lalr'), out=f)
+    os.replace(tmp, path)
+
+
+def parser_is_stale(path=parser_file):
+    try:
+        with open(path) as f:
+            return f.readline() != PARSER_HEADER
+    except OSError:
+        return True
+
+
+if parser_is_stale():
+    # no generated module for this grammar (make parser), build the tables in memory
+    from lark import Lark, Token
+    PARSER = Lark(GRAMMAR, parser='lalr')
+else:
+    from core.acl_parser import Lark_StandAlone, Token
+    PARSER = Lark_StandAlone()
+# trees from different parser modules are different classes
+PARSER_ID = f'{type(PARSER).__module__}:{GRAMMAR_HASH}'
 
 
 BINARY_EXPR = {
@@ -78,6 +107,16 @@ LITERAL_EVAL = {
     'NONE': lambda: None,
 }
 
+def first_token(t):
+    for child in t.children:
+        if isinstance(child, Token):
+            return child
+        if child is not None:
+            token = first_token(child)
+            if token is not None:
+                return token
+    return None
+
 def allow_acl(f):
     f.allow_acl = True
     return f
@@ -111,155 +150,334 @@ def check_allow_acl(f):
 #     return False
 
 
-class AclInterpreter(Interpreter):
-    def bind(self, tree, acl):
-        self._tree = tree
-        self._acl_str = acl
-
-    def reset(self, adv):
-        self._adv = adv
-        self._inst = self._adv
-        self._queue = deque()
-
-    def __call__(self, e):
-        self._e = e
-        self._inst = self._adv
-        try:
-            n_actcond = self._queue.popleft()
-            if not self.visit(n_actcond):
-                self._queue.appendleft(n_actcond)
-        except IndexError:
-            return self.visit(self._tree)
+class AclCompiler(object):
+    """
+    Lowers the parse tree into nested closures, once per acl.
+    Each closure takes the AclInterpreter so a compiled acl is not tied to an adv.
+    Literals and operator/pin/param lookups are resolved here, attribute lookups
+    on the adv stay dynamic since advs rebind them during the sim.
+    With coverage, every statement and if/elif/queue condition also counts its
+    evaluations, true results, actions taken and time into acl._coverage.
+    """
+    def __init__(self, coverage=False):
+        # pin commands the acl reads, all it can see of a think pin
+        self.pins = set()
+        # (line, column) of each instrumented statement, indexes acl._coverage
+        self.lines = [] if coverage else None
+
+    def compile(self, t):
+        return getattr(self, t.data)(t)
+
+    def pin_cmds(self):
+        return tuple(PIN_CMD[cmd] for cmd in sorted(self.pins))
+
+    def line(self, t):
+        token = first_token(t)
+        self.lines.append((token.line, token.column))
+        return len(self.lines) - 1
+
+    @staticmethod
+    def hit(idx, condition):
+        def hit(acl):
+            result = condition(acl)
+            if result:
+                acl._coverage[idx][1] += 1
+            return result
+        return hit
+
+    @staticmethod
+    def timed(idx, fn, always=False):
+        def timed(acl):
+            stat = acl._coverage[idx]
+            stat[0] += 1
+            if always:
+                stat[1] += 1
+            began = perf_counter()
+            try:
+                result = fn(acl)
+            finally:
+                stat[3] += perf_counter() - began
+            if result:
+                stat[2] += 1
+            return result
+        return timed
+
+    def statement(self, t):
+        if self.lines is None or t.data not in ('actcond', 'action'):
+            return self.compile(t)
+        idx = self.line(t)
+        if t.data == 'action':
+            return self.timed(idx, self.compile(t), always=True)
+        action, condition = t.children
+        action = self.compile(action)
+        condition = self.hit(idx, self.compile(condition))
+        def actcond(acl):
+            if condition(acl):
+                return action(acl)
+            return False
+        return self.timed(idx, actcond)
 
     def start(self, t):
-        for child in t.children:
-            result = self.visit(child)
-            # log('acl', str(result), str(t))
-            if result:
-                return True
-        return False
+        children = tuple(map(self.statement, t.children))
+        def start(acl):
+            for child in children:
+                if child(acl):
+                    return True
+            return False
+        return start
 
     def ifelse(self, t):
-        else_block = None
         if len(t.children) % 2 > 0:
-            else_block = t.children[-1]
             children_iter = pairs(t.children[:-1])
         else:
             children_iter = pairs(t.children)
-        for condition, block in children_iter:
-            if self.visit(condition):
-                return self.visit(block)
-        if else_block is not None:
-            return self.visit(else_block)
-        return False
+        if self.lines is None:
+            branches = tuple((self.compile(condition), self.statement(block)) for condition, block in children_iter)
+        else:
+            branches = tuple((self.line(condition), self.compile(condition), self.statement(block)) for condition, block in children_iter)
+        else_block = None
+        if len(t.children) % 2 > 0:
+            else_block = self.statement(t.children[-1])
+        if self.lines is not None:
+            def ifelse(acl):
+                # a branch is timed over its condition and, when true, its block
+                for idx, condition, block in branches:
+                    stat = acl._coverage[idx]
+                    stat[0] += 1
+                    began = perf_counter()
+                    try:
+                        if condition(acl):
+                            stat[1] += 1
+                            result = block(acl)
+                            if result:
+                                stat[2] += 1
+                            return result
+                    finally:
+                        stat[3] += perf_counter() - began
+                if else_block is not None:
+                    return else_block(acl)
+                return False
+            return ifelse
+        def ifelse(acl):
+            for condition, block in branches:
+                if condition(acl):
+                    return block(acl)
+            if else_block is not None:
+                return else_block(acl)
+            return False
+        return ifelse
 
     def ifqueue(self, t):
-        if self.visit(t.children[0]):
-            self._queue.extend(t.children[1:])
-            return True
-        return False
+        condition = self.compile(t.children[0])
+        if self.lines is not None:
+            idx = self.line(t)
+            condition = self.hit(idx, condition)
+        queued = tuple(map(self.statement, t.children[1:]))
+        def ifqueue(acl):
+            if condition(acl):
+                acl._queue.extend(queued)
+                return True
+            return False
+        if self.lines is not None:
+            return self.timed(idx, ifqueue)
+        return ifqueue
 
     def condition(self, t):
         args = t.children
         argl = len(t.children)
         if argl == 0:
-            return True
+            return lambda acl: True
         negate = False
         if isinstance(args[0], Token) and args[0].type == 'NOT': # NOT cond
             args = args[1:]
             argl -= 1
             negate = True
         if argl == 1:
-            res = self.visit(args[0])
-        else:
-            left, op, right = args
-            lres = self.visit(left)
-            try:
-                if SHORT_CIRCUIT[op.type](lres):
-                    return not lres if negate else lres
-            except KeyError:
-                pass
-            rres = self.visit(right)
-            res = BINARY_EXPR[op.type](lres, rres)
-        return not res if negate else res
+            res = self.compile(args[0])
+            if negate:
+                return lambda acl: not res(acl)
+            return res
+        left, op, right = args
+        left = self.compile(left)
+        right = self.compile(right)
+        if op.type == 'AND':
+            if negate:
+                return lambda acl: not (left(acl) and right(acl))
+            return lambda acl: left(acl) and right(acl)
+        if op.type == 'OR':
+            if negate:
+                return lambda acl: not (left(acl) or right(acl))
+            return lambda acl: left(acl) or right(acl)
+        binary = BINARY_EXPR[op.type]
+        if negate:
+            return lambda acl: not binary(left(acl), right(acl))
+        return lambda acl: binary(left(acl), right(acl))
 
     def selfcond(self, t):
-        inst = self._adv
-        children = t.children[0:-1]
+        chain = tuple(child.value for child in t.children[0:-1])
         last = t.children[-1]
-        for child in children:
-            inst = getattr(inst, child.value)
-        try:
-            self._inst = inst
-            value = self.visit(last)
-            self._inst = self._adv
-        except AttributeError:
-            value = getattr(inst, last.value)
-        return value
+        if isinstance(last, Token):
+            name = last.value
+            member = lambda acl, inst: getattr(inst, name)
+        else:
+            member = self.compile_member(last)
+        if not chain:
+            return lambda acl: member(acl, acl._adv)
+        def selfcond(acl):
+            inst = acl._adv
+            for attr in chain:
+                inst = getattr(inst, attr)
+            return member(acl, inst)
+        return selfcond
 
     def arithmetic(self, t):
         if len(t.children) == 3:
             left, op, right = t.children
-            res = BINARY_EXPR[op.type](self.visit(left), self.visit(right))
-            return res
-        return 0
+            left = self.compile(left)
+            right = self.compile(right)
+            binary = BINARY_EXPR[op.type]
+            return lambda acl: binary(left(acl), right(acl))
+        return lambda acl: 0
 
-    # @v_args(inline=True)
-    # def actcond(self, action, condition):
     def actcond(self, t):
         action, condition = t.children
-        if self.visit(condition):
-            return self.visit(action)
-        return False
+        action = self.compile(action)
+        condition = self.compile(condition)
+        def actcond(acl):
+            if condition(acl):
+                return action(acl)
+            return False
+        return actcond
 
-    # @v_args(inline=True)
-    # def params(self, p):
     def params(self, t):
-        p = t.children[0]
-        return PARAM_EVAL[p.type](self._adv)
+        param = PARAM_EVAL[t.children[0].type]
+        return lambda acl: param(acl._adv)
 
-    # @v_args(inline=True)
-    # def pincond(self, cmd):
     def pincond(self, t):
-        cmd = t.children[0]
-        return PIN_CMD[cmd.type](self._e)
+        self.pins.add(t.children[0].type)
+        pin = PIN_CMD[t.children[0].type]
+        return lambda acl: pin(acl._e)
 
-    # @v_args(inline=True)
-    # def action(self, act):
     def action(self, t):
         act = t.children[0]
-        self._inst = self._adv
         if isinstance(act, Token):
-            return getattr(self._adv, act.value)()
-        else:
-            return self.visit(act)
+            name = act.value
+            return lambda acl: getattr(acl._adv, name)()
+        function = self.compile_member(act)
+        return lambda acl: function(acl, acl._adv)
 
-    # @v_args(inline=True)
-    # def literal(self, token):
     def literal(self, t):
         token = t.children[0]
-        return LITERAL_EVAL[token.type](token.value)
-
-    # @v_args(inline=True)
-    # def function(self, fn, *args):
-    def function(self, t):
-        fn = t.children[0]
-        fn_obj = getattr(self._inst, fn.value)
-        if not check_allow_acl(fn_obj):
-            return False
-        args = t.children[1:]
-        result = fn_obj(*map(self.visit, args))
-        # log('acl', str(t), str(result))
-        return result
-
-    # @v_args(inline=True)
-    # def indice(self, fn, idx):
-    def indice(self, t):
+        literal_eval = LITERAL_EVAL[token.type]
+        try:
+            value = literal_eval(token.value)
+        except TypeError:
+            # fail when evaluated, like the tree walk did
+            return lambda acl: literal_eval(token.value)
+        return lambda acl: value
+
+    # function and indice resolve against an instance picked by selfcond/action
+    def compile_member(self, t):
+        return getattr(self, f'member_{t.data}')(t)
+
+    def member_function(self, t):
+        name = t.children[0].value
+        args = tuple(map(self.compile, t.children[1:]))
+        def function(acl, inst):
+            fn_obj = getattr(inst, name)
+            if not check_allow_acl(fn_obj):
+                return False
+            return fn_obj(*[arg(acl) for arg in args])
+        return function
+
+    def member_indice(self, t):
         fn, idx = t.children
+        idx = self.compile(idx)
         if isinstance(fn, Token):
-            return getattr(self._inst, fn.value)[self.visit(idx)]
-        else:
-            return self.visit(fn)[self.visit(idx)]
+            name = fn.value
+            return lambda acl, inst: getattr(inst, name)[idx(acl)]
+        function = self.member_function(fn)
+        return lambda acl, inst: function(acl, inst)[idx(acl)]
+
+
+class AclInterpreter(object):
+    def bind(self, tree, acl, root=None, pin_cmds=None, lines=None):
+        self._tree = tree
+        self._acl_str = acl
+        if root is None:
+            compiler = AclCompiler()
+            root = compiler.compile(tree)
+            pin_cmds = compiler.pin_cmds()
+            lines = compiler.lines
+        self._root = root
+        self._pin_cmds = pin_cmds
+        self._lines = lines
+        self._source = None
+
+    def set_source(self, source):
+        # (line number, text) in the user's acl for each pre parsed line
+        self._source = source
+
+    def instrumented(self):
+        # same acl compiled with per statement coverage counters
+        interpreter = AclInterpreter()
+        interpreter.bind(*_compile_acl(self._acl_str, True))
+        interpreter.set_source(self._source)
+        return interpreter
+
+    def coverage(self):
+        """
+        Per statement counters of an instrumented acl in source order, None otherwise.
+        evals: times the statement or if/elif/queue condition was reached
+        true: times its condition held
+        taken: times it acted (for if/elif: its block acted, for queue: it queued)
+        time: cumulative seconds spent in it, inclusive of nested statements
+        """
+        if self._lines is None:
+            return None
+        parsed = self._acl_str.split('\n')
+        source = self._source or list(enumerate(parsed, 1))
+        coverage = []
+        for (line, column), stat in sorted(zip(self._lines, self._coverage)):
+            # pre parsing keeps the ; count of every line, so the nth statement maps back
+            nth = parsed[line-1].count(';', 0, column-1)
+            src_line, text = source[line-1]
+            statement = text.split(';')[nth].strip()
+            evals, true, taken, time = stat
+            coverage.append({
+                'line': src_line,
+                'statement': statement,
+                'evals': evals,
+                'true': true,
+                'taken': taken,
+                'time': time,
+            })
+        return coverage
+
+    def pin_view(self, e):
+        # think pins with the same view are indistinguishable to this acl
+        view = []
+        for cmd in self._pin_cmds:
+            try:
+                view.append(cmd(e))
+            except Exception as exc:
+                view.append(type(exc))
+        return tuple(view)
+
+    def reset(self, adv):
+        self._adv = adv
+        self._queue = deque()
+        if self._lines is not None:
+            self._coverage = [[0, 0, 0, 0.0] for _ in self._lines]
+
+    def __call__(self, e):
+        self._e = e
+        try:
+            n_actcond = self._queue.popleft()
+            if not n_actcond(self):
+                self._queue.appendleft(n_actcond)
+        except IndexError:
+            return self._root(self)
 
 
 FSN_PATTERN = re.compile(r'(^|;)`?(fs|s)(\d+)(\(([^)]+)\))?')
@@ -270,14 +488,95 @@ def _pre_parse(acl):
     )))
 
 
+def _source_lines(acl):
+    # the lines _pre_parse keeps, as (line number, text) of the original acl
+    return [(n, l.strip()) for n, l in enumerate(acl.split('\n'), 1) if l.strip()]
+
+
+# parsed trees pickled by content hash, off unless a directory is set
+# mass pool workers and deploy turn it on at ACL_CACHE_DIR, an empty value keeps it off
+ACL_CACHE_DIR = os.getenv('ACL_CACHE_DIR', os.path.join(ROOT_DIR, '.acl_cache')) or None
+DISK_CACHE_DIR = None
+DISK_CACHE_STATS = {'hits': 0, 'misses': 0}
+
+def set_disk_cache(path):
+    global DISK_CACHE_DIR
+    if path is not None:
+        os.makedirs(path, exist_ok=True)
+    DISK_CACHE_DIR = path
+
+
+def _parse(acl):
+    if DISK_CACHE_DIR is None:
+        return PARSER.parse(acl)
+    key = hashlib.sha256(f'{PARSER_ID}\n{acl}'.encode()).hexdigest()
+    fn = os.path.join(DISK_CACHE_DIR, f'{key}.pickle')
+    try:
+        with open(fn, 'rb') as f:
+            tree = pickle.load(f)
+        DISK_CACHE_STATS['hits'] += 1
+        return tree
+    except (OSError, EOFError, pickle.UnpicklingError):
+        pass
+    DISK_CACHE_STATS['misses'] += 1
+    tree = PARSER.parse(acl)
+    tmp = f'{fn}.{os.getpid()}'
+    try:
+        with open(tmp, 'wb') as f:
+            pickle.dump(tree, f)
+        os.replace(tmp, fn)
+    except OSError:
+        pass
+    return tree
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _compile_acl(acl, coverage=False):
+    # compiled closures hold no adv state, so one template serves every interpreter
+    tree = _parse(acl)
+    compiler = AclCompiler(coverage=coverage)
+    return tree, acl, compiler.compile(tree), compiler.pin_cmds(), compiler.lines
+
+
+def acl_cache_info():
+    info = _compile_acl.cache_info()
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'size': info.currsize,
+        'disk_hits': DISK_CACHE_STATS['hits'],
+        'disk_misses': DISK_CACHE_STATS['misses'],
+    }
+
+
 def build_acl(acl):
     if isinstance(acl, list):
         acl = '\n'.join(acl)
     if len(acl) > CHAR_LIMIT:
         raise ValueError(f'ACL cannot be longer than {CHAR_LIMIT} characters.')
-    acl = _pre_parse(acl)
-    tree = PARSER.parse(acl)
     interpreter = AclInterpreter()
-    interpreter.bind(tree, acl)
+    interpreter.bind(*_compile_acl(_pre_parse(acl)))
+    interpreter.set_source(_source_lines(acl))
     return interpreter
 
+
+if __name__ == '__main__':
+    # startup benchmark: pre-generated tables vs analysing the grammar
+    import sys
+    import subprocess
+    def import_time(code):
+        best = None
+        for _ in range(5):
+            out = subprocess.run([sys.executable, '-c', f'import time; t = time.perf_counter(); {code}; print(time.perf_counter() - t)'], capture_output=True, text=True, cwd=ROOT_DIR)
+            t = float(out.stdout)
+            best = t if best is None else min(best, t)
+        return best
+    import py_compile
+    if parser_is_stale():
+        generate_parser()
+    py_compile.compile(parser_file)
+    standalone = import_time('from core.acl_parser import Lark_StandAlone; Lark_StandAlone()')
+    analysed = import_time(f'from lark import Lark; Lark(open({lark_file!r}).read(), parser="lalr")')
+    print(f'standalone parser: {standalone*1000:.1f}ms')
+    print(f'lark from grammar: {analysed*1000:.1f}ms')
+    print(f'saved:             {(analysed-standalone)*1000:.1f}ms')
@@ -1,6 +1,5 @@
 import operator
 import sys
-import random
 from functools import reduce
 from itertools import product, chain
 from collections import OrderedDict
@@ -141,6 +140,41 @@ class Nop(object):
     has_delayed = 0
 
 
+class HitTimer(PooledTimer):
+    __slots__ = ('pin', 'name', 'base', 'group', 'index', 'level', 'aseq', 'attr', 'onhit', 'proc', 'actmod')
+
+
+class HitAttr(object):
+    """
+    One attr dict compiled for repeated hits: the log fingerprint, the resolved
+    cond/iv/dmg fields, the modifiers/steps bound by Adv.compile_hitattr, and
+    the interned damage source of the name that last made it
+    """
+    __slots__ = ('attr', 'attr_str', 'cond', 'iv', 'nospd', 'msl', 'dmg', 'fade', 'extra', 'mods', 'steps', 'src')
+
+    def __init__(self, attr):
+        self.attr = attr
+        self.attr_str = Log.fmt_hitattr(attr)
+        self.cond = attr.get('cond')
+        self.iv = attr.get('iv', 0)
+        self.nospd = attr.get('nospd')
+        self.msl = attr.get('msl')
+        self.dmg = attr.get('dmg')
+        self.fade = attr.get('fade')
+        self.extra = attr.get('extra')
+        self.mods = ()
+        self.steps = ()
+        self.src = None
+
+
+class AttenuationTimer(PooledTimer):
+    __slots__ = ('dname', 'dmg_coef', 'dtype', 'hitmods', 'attenuation', 'depth')
+
+
+class ThinkTimer(PooledTimer):
+    __slots__ = ('pin', 'dname', 'dstat', 'didx', 'dhit', 'pins', 'pushes')
+
+
 class Action(object):
     _static = Static({
         'prev': 0,
@@ -282,6 +316,7 @@ class Action(object):
         self.act_event()
 
     def add_delayed(self, mt):
+        mt.owner = self
         self.delayed.add(mt)
 
     def clear_delayed(self):
@@ -290,6 +325,7 @@ class Action(object):
             if mt.online:
                 count += 1
             mt.off()
+            mt.release()
         self.delayed = set()
         return count
 
@@ -578,6 +614,9 @@ class Adv(object):
     _acl_default = None
     _acl_dragonbattle = core.acl.build_acl('`dragon')
     _acl = None
+    # run the acl with per statement counters, see AclInterpreter.coverage
+    acl_coverage = False
+    RATE_MEMO_SIZE = 256
 
     @property
     def variant(self):
@@ -652,6 +691,7 @@ class Adv(object):
             for attr in conf['attr']:
                 if not isinstance(attr, dict):
                     continue
+                self.compile_hitattr(attr, name)
                 if 'dmg' in attr:
                     self.damage_sources.add(name)
                 aff = attr.get('afflic')
@@ -670,8 +710,12 @@ class Adv(object):
         self.base_buff = Buff()
         self.all_buffs = []
         self.base_buff._static.all_buffs = self.all_buffs
+        self.buff_index = BuffIndex()
+        self.base_buff._static.buff_index = self.buff_index
         self.base_buff._static.adv = self
         self.active_buff_dict = ActiveBuffDict()
+        self.hitattrs = {}
+        self.hit_callbacks = {}
         # set modifier
         self.modifier = Modifier(0, 0, 0, 0)
         self.all_modifiers = ModifierDict()
@@ -729,6 +773,15 @@ class Adv(object):
         self.hits = 0
         self.last_c = 0
 
+        # think pins due at the same time share one timer, see think_pin
+        self.think_next = None
+        self.think_skip = self.conf['think_skip'] is not False
+        self.think_evals = 0
+        self.think_skipped = 0
+        self.think_merged = 0
+        # crit/killer sums by rates and modifiers, see memo_rates
+        self.rate_memo = {}
+
         self.hp = 100
         self.hp_event = Event('hp')
         self.dragonform = None
@@ -795,10 +848,11 @@ class Adv(object):
         self.hp = max(min(hp, 100), 0)
         if self.hp != old_hp:
             delta = self.hp-old_hp
-            if self.hp == 0:
-                log('hp', f'=1', f'{delta/100:.2%}')
-            else:
-                log('hp', f'{self.hp/100:.2%}', f'{delta/100:.2%}')
+            if self.ctx.logs.keep_record:
+                if self.hp == 0:
+                    log('hp', f'=1', f'{delta/100:.2%}')
+                else:
+                    log('hp', f'{self.hp/100:.2%}', f'{delta/100:.2%}')
             self.condition.hp_cond_set(self.hp)
             self.hp_event.hp = self.hp
             self.hp_event.delta = delta
@@ -815,6 +869,8 @@ class Adv(object):
                         vars(self.afflics)[afflic].resist = res_conf[afflic]
                     else:
                         vars(self.afflics)[afflic].resist = 100
+        if 'afflict_epsilon' in self.conf:
+            self.afflics.set_epsilon(self.conf.afflict_epsilon)
 
     def sim_affliction(self):
         if 'sim_afflict' in self.conf:
@@ -880,7 +936,7 @@ class Adv(object):
     def default_slot(self):
         self.slots = Slots(self.name, self.conf.c, self.sim_afflict, bool(self.conf['flask_env']))
 
-    def __init__(self, name=None, conf=None, duration=180, cond=None, equip_key=None):
+    def __init__(self, name=None, conf=None, duration=180, cond=None, equip_key=None, seed=None, stream=None, log_sink='full'):
         if not name:
             raise ValueError('Adv module must have a name')
         self.name = name
@@ -895,7 +951,12 @@ class Adv(object):
 
         self.conf_base = Conf(self.conf or {})
         self.conf_init = Conf(conf or {})
-        self.ctx = Ctx().on()
+        if seed is None:
+            # same run configuration, same draws
+            seed = f'{self.__class__.__name__}|{self.name}|{duration}|{cond}|{equip_key}|{conf}'
+        if stream is not None:
+            seed = f'{seed}#{stream}'
+        self.ctx = SimContext(seed=seed, log_sink=log_sink).on()
         self.condition = Condition(cond)
         self.duration = duration
 
@@ -931,30 +992,36 @@ class Adv(object):
 
         self.stats = []
 
-    def dmg_mod(self, name):
-        mod = 1
-        scope = name.split('_')
-        if scope[0] == 'o':
-            scope = scope[1]
+    def dmg_mod(self, name, src=None):
+        if src is not None:
+            # hits carry their interned source, the scope is cached on it
+            if src.dmg_scope is None:
+                src.dmg_scope = self.dmg_scope(name)
+            mtype, mod = src.dmg_scope
         else:
-            scope = scope[0]
-        if name.startswith('dx') or name == 'dshift':
-            scope = 'x'
-        elif name in ('ds', 'ds_final'):
-            scope = 's'
+            try:
+                mtype, mod = self.dmg_scopes[name]
+            except KeyError:
+                mtype, mod = self.dmg_scopes[name] = self.dmg_scope(name)
+        if mtype is None:
+            return mod
+        return mod * self.mod(mtype)
 
-        if scope[0] == 's':
+    def dmg_scope(self, name):
+        mod = 1
+        scope = self.ctx.logs.source(name).scope
+        if scope[0:1] == 's':
             try:
                 mod = 1 if name in ('ds', 'ds_final') or self.a_s_dict[scope].owner is None else self.skill_share_att
             except:
                 pass
-            return mod * self.mod('s')
+            return 's', mod
         elif scope[0:2] == 'fs':
-            return mod * self.mod('fs')
-        elif scope[0] == 'x':
-            return mod * self.mod('x')
+            return 'fs', mod
+        elif scope[0:1] == 'x':
+            return 'x', mod
         else:
-            return mod
+            return None, mod
 
     @allow_acl
     def mod(self, mtype, operator=None, initial=1):
@@ -1002,6 +1069,14 @@ class Adv(object):
                     raise ValueError(f"Invalid crit mod order {order}")
 
         rate_list = self.build_rates()
+        m = self.memo_rates('crit', rate_list, m, self.crit_rates)
+
+        chance = min(m['chance'], 1)
+        cdmg = m['damage'] + 1.7
+
+        return chance, cdmg
+
+    def crit_rates(self, rate_list, m):
         for mask in product(*[[0, 1]] * len(rate_list)):
             p = 1.0
             modifiers = defaultdict(lambda: set())
@@ -1019,11 +1094,29 @@ class Adv(object):
             # total += p * reduce(operator.mul, [1 + sum([mod.get() for mod in order]) for order in modifiers.values()], 1.0)
             for order, values in modifiers.items():
                 m[order] += p * sum([mod.get() for mod in values])
-
-        chance = min(m['chance'], 1)
-        cdmg = m['damage'] + 1.7
-
-        return chance, cdmg
+        return m
+
+    def memo_rates(self, kind, rate_list, initial, combine):
+        # the sum over every on/off mask of the rates only depends on the rates, the
+        # starting value and the {cond}_{kind} modifiers, so repeats are looked up
+        key = (
+            kind,
+            tuple(initial.items()) if isinstance(initial, dict) else initial,
+            tuple(rate_list),
+            tuple(
+                tuple((order, tuple((id(mod), mod.get()) for mod in mods)) for order, mods in self.all_modifiers[f'{cond_name}_{kind}'].items())
+                for cond_name, _ in rate_list
+            )
+        )
+        try:
+            return self.rate_memo[key]
+        except KeyError:
+            pass
+        if len(self.rate_memo) >= self.RATE_MEMO_SIZE:
+            self.rate_memo.clear()
+        result = combine(rate_list, initial)
+        self.rate_memo[key] = result
+        return result
 
     def solid_crit_mod(self, name=None):
         chance, cdmg = self.combine_crit_mods()
@@ -1032,7 +1125,7 @@ class Adv(object):
 
     def rand_crit_mod(self, name=None):
         chance, cdmg = self.combine_crit_mods()
-        r = random.random()
+        r = self.ctx.rng.random()
         if r < chance:
             return cdmg
         else:
@@ -1056,7 +1149,8 @@ class Adv(object):
                 rates[afflic] = rate
 
         debuff_rates = {}
-        for buff in self.all_buffs:
+        debuffs = chain(self.buff_index.by_bufftype('debuff'), self.buff_index.by_name('simulated_def'))
+        for buff in self.buff_index.scan(debuffs):
             if buff.get() and (buff.bufftype == 'debuff' or buff.name == 'simulated_def') and buff.val < 0:
                 dkey = f'debuff_{buff.mod_type}'
                 try:
@@ -1081,6 +1175,9 @@ class Adv(object):
     def killer_mod(self, name=None):
         total = self.mod('killer') - 1
         rate_list = self.build_rates()
+        return self.memo_rates('killer', rate_list, total, self.killer_rates)
+
+    def killer_rates(self, rate_list, total):
         for mask in product(*[[0, 1]] * len(rate_list)):
             p = 1.0
             modifiers = defaultdict(lambda: set())
@@ -1134,18 +1231,19 @@ class Adv(object):
 
     @allow_acl
     def have_buff(self, name):
-        for b in self.all_buffs:
+        for b in self.buff_index.scan(self.buff_index.by_prefix(name), ordered=False):
             if b.name.startswith(name) and b.get():
                 return True
         return False
 
     @allow_acl
     def buffstack(self, name):
-        return reduce(lambda s, b: s+int(b.get() and b.name == name), self.all_buffs, 0)
+        return reduce(lambda s, b: s+int(b.get() and b.name == name), self.buff_index.scan(self.buff_index.by_name(name), ordered=False), 0)
 
     @property
     def buffcount(self):
-        buffcount = reduce(lambda s, b: s+int(b.get() and b.bufftype in ('self', 'team') and not b.hidden), self.all_buffs, 0)
+        buffs = self.buff_index.scan(self.buff_index.by_bufftype('self', 'team'), ordered=False)
+        buffcount = reduce(lambda s, b: s+int(b.get() and b.bufftype in ('self', 'team') and not b.hidden), buffs, 0)
         if self.conf['sim_buffbot.count'] is not None:
             buffcount += self.conf.sim_buffbot.count
         return buffcount
@@ -1214,7 +1312,7 @@ class Adv(object):
     def l_x(self, e):
         # FIXME: race condition?
         x_max = self.conf[self.current_x].x_max
-        if e.index == x_max:
+        if e.index == x_max and self.ctx.logs.keep_record:
             log('x', e.name, 0, '-'*38 + f'c{x_max}')
         else:
             log('x', e.name, 0)
@@ -1246,7 +1344,8 @@ class Adv(object):
             return True
         else:
             self.hits = self.echo
-            log('combo', f'reset combo after {delta:.02}s')
+            if self.ctx.logs.keep_record:
+                log('combo', f'reset combo after {delta:.02}s')
             return False
 
     def load_aff_conf(self, key):
@@ -1416,7 +1515,7 @@ class Adv(object):
 
         self.ctx.on()
         self.doconfig()
-        logreset()
+        self.ctx.logs.reset()
 
         self.l_idle = Listener('idle', self.l_idle)
         self.l_x = Listener('x', self.l_x)
@@ -1440,6 +1539,9 @@ class Adv(object):
         self.config_slots()
 
         preruns_ss = self.config_skills()
+        self.dmg_scopes = {}
+        for src in self.ctx.logs.source_list:
+            src.dmg_scope = None
 
         # if self.conf.c.a:
         #     self.slots.c.a = list(self.conf.c.a)
@@ -1471,6 +1573,8 @@ class Adv(object):
             self._acl = self._acl_default
         else:
             self._acl = core.acl.build_acl(self.conf.acl)
+        if self.acl_coverage:
+            self._acl = self._acl.instrumented()
         self._acl.reset(self)
 
         self.displayed_att = int(self.base_att * self.mod('att'))
@@ -1519,7 +1623,9 @@ class Adv(object):
         #         self.comment += '; '
         #     self.comment += f'{d/g_logs.team_doublebuffs:.2f}s team doublebuff interval'
 
-        self.logs = copy.deepcopy(g_logs)
+        # the log belongs to this run, hand it over and leave the context a fresh one
+        self.logs = self.ctx.logs
+        self.ctx.logs = Log(self.logs.sink)
 
         return end
 
@@ -1561,14 +1667,49 @@ class Adv(object):
             latency = self.conf.latency.default
 
         doing = self.action.getdoing()
-
-        t = Timer(self.cb_think)
-        t.pin = pin
-        t.dname = doing.name
-        t.dstat = doing.status
-        t.didx = doing.index
-        t.dhit = int(doing.has_delayed)
+        pins = (pin, doing.name, doing.status, doing.index, int(doing.has_delayed))
+
+        # join the pending think if it fires at the same time and nothing was
+        # scheduled since, that is, if this pin would have run right after it
+        t = self.think_next
+        pushes = self.ctx.timeline.pushes
+        if t is not None and t.pushes == pushes and t.online and t.timing == self.ctx.now + latency:
+            t.pins.append(pins)
+            self.think_merged += 1
+            return
+        t = ThinkTimer.get(self.cb_think_pins)
+        t.pins = [pins]
         t.on(latency)
+        t.pushes = self.ctx.timeline.pushes
+        self.think_next = t
+
+    def cb_think_pins(self, t):
+        if self.think_next is t:
+            self.think_next = None
+        # a think that did nothing changes nothing, so the same pin right after
+        # it would do nothing too: no action, no timer pushed, no acl queue
+        skip = self.think_skip and self.cb_think == self._cb_think
+        timeline = self.ctx.timeline
+        last = None
+        for i, pins in enumerate(t.pins):
+            if i and timeline.over():
+                # as separate timers, the run would have stopped before this pin
+                break
+            t.pin, t.dname, t.dstat, t.didx, t.dhit = pins
+            if skip:
+                if self._acl._queue:
+                    view = None
+                else:
+                    view = (timeline.pushes, self._acl.pin_view(t))
+                    if view == last:
+                        self.think_skipped += 1
+                        continue
+            result = self.cb_think(t)
+            self.think_evals += 1
+            if skip and view is not None and not result and not self._acl._queue:
+                last = (timeline.pushes, view[1])
+            else:
+                last = None
 
     def l_silence_end(self, e):
         doing = self.action.getdoing()
@@ -1616,11 +1757,12 @@ class Adv(object):
             if no_autocharge and hasattr(s, 'autocharge_timer'):
                 continue
             s.charge(self.sp_convert(percent, s.sp))
-        if isinstance(target, list):
-            t_str = ','.join(target)
-        else:
-            t_str = target
-        log('sp', name if not target else f'{name}->{t_str}', f'{percent*100:.0f}%', ', '.join([f'{s.charged}/{s.sp}' for s in self.skills]))
+        if self.ctx.logs.keep_record:
+            if isinstance(target, list):
+                t_str = ','.join(target)
+            else:
+                t_str = target
+            log('sp', name if not target else f'{name}->{t_str}', f'{percent*100:.0f}%', ', '.join([f'{s.charged}/{s.sp}' for s in self.skills]))
 
         if percent == 1:
             self.think_pin('prep')
@@ -1633,11 +1775,12 @@ class Adv(object):
             return
         for s in targets:
             s.charge(sp)
-        if isinstance(target, list):
-            t_str = ','.join(target)
-        else:
-            t_str = target
-        log('sp', name if not target else f'{name}_{t_str}', sp, ', '.join([f'{s.charged}/{s.sp}' for s in self.skills]))
+        if self.ctx.logs.keep_record:
+            if isinstance(target, list):
+                t_str = ','.join(target)
+            else:
+                t_str = target
+            log('sp', name if not target else f'{name}_{t_str}', sp, ', '.join([f'{s.charged}/{s.sp}' for s in self.skills]))
 
         self.think_pin('sp')
 
@@ -1654,15 +1797,19 @@ class Adv(object):
         e.ret = e.dmg
         return
 
-    def dmg_formula(self, name, dmg_coef):
-        dmg_mod = self.dmg_mod(name)
+    def dmg_formula(self, name, dmg_coef, src=None):
+        dmg_mod = self.dmg_mod(name, src)
         att = 1.0 * self.att_mod(name) * self.base_att
         armor = 10 * self.def_mod()
         ele = (self.mod(self.slots.c.ele) + 0.5) * (self.mod(f'{self.slots.c.ele}_resist'))
         return 5.0 / 3 * dmg_coef * dmg_mod * att / armor * ele  # true formula
 
     def l_true_dmg(self, e):
-        log('dmg', e.dname, e.count, e.comment)
+        # dot and bleed events tick many times under one name, keep its interned source on them
+        src = getattr(e, 'src', None)
+        if src is None or src.name != e.dname:
+            src = e.src = self.ctx.logs.source(e.dname)
+        log('dmg', src, e.count, e.comment)
 
     def l_dmg_make(self, e):
         try:
@@ -1677,19 +1824,24 @@ class Adv(object):
             hitmods=t.hitmods, attenuation=t.attenuation, depth=t.depth
         )
 
-    def dmg_make(self, name, coef, dtype=None, fixed=False, hitmods=None, attenuation=None, depth=0):
+    def dmg_make(self, name, coef, dtype=None, fixed=False, hitmods=None, attenuation=None, depth=0, src=None):
         if coef <= 0.01:
             return 0
+        if src is None:
+            src = self.ctx.logs.source(name)
         if dtype == None:
             dtype = name
+            dtype_src = src
+        else:
+            dtype_src = None
         if hitmods is not None:
             for m in hitmods:
                 m.on()
-        count = self.dmg_formula(dtype, coef) if not fixed else coef
+        count = self.dmg_formula(dtype, coef, dtype_src) if not fixed else coef
         if hitmods is not None:
             for m in hitmods:
                 m.off()
-        log('dmg', name, count)
+        log('dmg', src, count)
         self.dmg_proc(name, count)
         if fixed:
             return count
@@ -1700,7 +1852,10 @@ class Adv(object):
             else:
                 echo_count = self.dmg_formula_echo(coef)
             self.dmg_proc(name, echo_count)
-            log('dmg', 'echo', echo_count, f'from {name}')
+            if self.ctx.logs.keep_record:
+                log('dmg', 'echo', echo_count, f'from {name}')
+            else:
+                log('dmg', 'echo', echo_count)
             count += echo_count
         if attenuation is not None:
             rate, pierce, hitmods = attenuation
@@ -1711,7 +1866,7 @@ class Adv(object):
                     name = f'{name}_extra{depth}'
                 else:
                     name = '_'.join(name.split('_')[:-1]) + f'_extra{depth}'
-                t = Timer(self.l_attenuation)
+                t = AttenuationTimer.get(self.l_attenuation)
                 t.dname = name
                 t.dmg_coef = coef
                 t.dtype = dtype
@@ -1721,108 +1876,149 @@ class Adv(object):
                 t.on(self.conf.attenuation.delay)
         return count
 
-    def hitattr_make(self, name, base, group, aseq, attr, onhit=None):
-        g_logs.log_hitattr(name, attr)
-        hitmods = self.actmods(name)
-        if 'dmg' in attr:
-            if 'killer' in attr:
-                hitmods.append(KillerModifier(name, 'hit', *attr['killer']))
-            if 'crisis' in attr:
-                hitmods.append(CrisisModifier(name, attr['crisis'], self.hp))
-            if 'bufc' in attr:
-                hitmods.append(Modifier(f'{name}_bufc', 'att', 'bufc', attr['bufc']*self.buffcount))
-            if 'fade' in attr:
-                attenuation = (attr['fade'], self.conf.attenuation.hits, hitmods)
-            else:
-                attenuation = None
-            for m in hitmods:
-                m.on()
-            if 'extra' in attr:
-                for _ in range(min(attr['extra'], round(self.buffcount))):
-                    self.add_combo(name)
-                    self.dmg_make(name, attr['dmg'], attenuation=attenuation)
-            else:
-                self.add_combo(name)
-                self.dmg_make(name, attr['dmg'], attenuation=attenuation)
-
-        if onhit:
-            onhit(name, base, group, aseq)
-
+    def compile_hitattr(self, attr, name=None):
+        hit = HitAttr(attr)
+        if name is not None and hit.dmg is not None:
+            hit.src = self.ctx.logs.source(name)
+        mods = []
+        if 'killer' in attr:
+            killer = attr['killer']
+            mods.append(lambda name: KillerModifier(name, 'hit', *killer))
+        if 'crisis' in attr:
+            crisis = attr['crisis']
+            mods.append(lambda name: CrisisModifier(name, crisis, self.hp))
+        if 'bufc' in attr:
+            bufc = attr['bufc']
+            mods.append(lambda name: Modifier(f'{name}_bufc', 'att', 'bufc', bufc*self.buffcount))
+        hit.mods = tuple(mods)
+
+        steps = []
         if 'sp' in attr:
             if isinstance(attr['sp'], int):
-                if name.startswith('dx'):
-                    self.dragonform.ds_charge(attr['sp'])
-                else:
-                    value = attr['sp']
-                    self.charge(base, value)
+                sp = attr['sp']
+                def sp_step(name, base, group, aseq):
+                    if name.startswith('dx'):
+                        self.dragonform.ds_charge(sp)
+                    else:
+                        self.charge(base, sp)
             else:
                 value = attr['sp'][0]
                 mode = None if len(attr['sp']) == 1 else attr['sp'][1]
                 target = None if len(attr['sp']) == 2 else attr['sp'][2]
+                charge_f = self.charge_p if mode == '%' else self.charge
                 if target == 'sn':
-                    target = base
-                charge_f = self.charge
-                if mode == '%':
-                    charge_f = self.charge_p
-                charge_f(base, value, target=target)
+                    sp_step = lambda name, base, group, aseq: charge_f(base, value, target=base)
+                else:
+                    sp_step = lambda name, base, group, aseq: charge_f(base, value, target=target)
+            steps.append(sp_step)
 
         if 'dp' in attr:
-            self.dragonform.charge_gauge(attr['dp'])
+            dp = attr['dp']
+            steps.append(lambda name, base, group, aseq: self.dragonform.charge_gauge(dp))
 
         if 'utp' in attr:
-            self.dragonform.charge_gauge(attr['utp'], utp=True)
+            utp = attr['utp']
+            steps.append(lambda name, base, group, aseq: self.dragonform.charge_gauge(utp, utp=True))
 
         if 'hp' in attr:
             try:
-                self.add_hp(float(attr['hp']))
+                hp = float(attr['hp'])
+                steps.append(lambda name, base, group, aseq: self.add_hp(hp))
             except TypeError:
-                value = attr['hp'][0]
+                hp = attr['hp'][0]
                 mode = None if len(attr['hp']) == 1 else attr['hp'][1]
                 if mode == '=':
-                    self.set_hp(value)
+                    steps.append(lambda name, base, group, aseq: self.set_hp(hp))
                 elif mode == '>':
-                    if self.hp > value:
-                        self.set_hp(value)
+                    def hp_step(name, base, group, aseq):
+                        if self.hp > hp:
+                            self.set_hp(hp)
+                    steps.append(hp_step)
                 elif mode == '%':
-                    self.set_hp(self.hp*value)
+                    steps.append(lambda name, base, group, aseq: self.set_hp(self.hp*hp))
 
         if 'afflic' in attr:
-            aff_type, aff_args = attr['afflic'][0], attr['afflic'][1:]
-            getattr(self.afflics, aff_type).on(name, *aff_args)
-            if self.conf['fleet']:
-                try:
-                    aff_args[1] = 0
-                except IndexError:
-                    pass
-                for _ in range(self.conf['fleet']):
-                    getattr(self.afflics, aff_type).on(name, *aff_args)
+            aff_type, aff_args = attr['afflic'][0], tuple(attr['afflic'][1:])
+            fleet_args = aff_args[:1] + (0,) + aff_args[2:] if len(aff_args) > 1 else aff_args
+            steps.append(lambda name, base, group, aseq: self.hitattr_afflic(name, aff_type, aff_args, fleet_args))
 
         if 'bleed' in attr:
             rate, mod = attr['bleed']
-            rate = max(min(100, rate + self.sub_mod('debuff_rate', 'passive') * 100), 0)
-            debufftime = self.mod('debuff', operator=operator.add)
-            if self.conf.mbleed or (rate < 100 and base[0] == 's' and self.a_s_dict[base].owner is not None):
-                from module.bleed import mBleed
-                if self.bleed is None:
-                    self.bleed = mBleed('init', mod)
-                    self.bleed.reset()
-                self.bleed = mBleed(base, mod, chance=rate/100, debufftime=debufftime)
-                self.bleed.on()
-            else:
-                from module.bleed import Bleed
-                if self.bleed is None:
-                    self.bleed = Bleed('init', mod)
-                    self.bleed.reset()
-                if rate == 100 or rate >= random.uniform(0, 100):
-                    self.bleed = Bleed(base, mod, debufftime=debufftime)
-                    self.bleed.on()
+            steps.append(lambda name, base, group, aseq: self.hitattr_bleed(base, rate, mod))
 
         if 'buff' in attr:
-            self.hitattr_buff_outer(name, base, group, aseq, attr)
+            steps.append(lambda name, base, group, aseq: self.hitattr_buff_outer(name, base, group, aseq, attr))
+
+        hit.steps = tuple(steps)
+        self.hitattrs[id(attr)] = hit
+        return hit
+
+    def hitattr(self, attr):
+        # keyed by id, the entry only counts if it was compiled from this very dict
+        hit = self.hitattrs.get(id(attr))
+        if hit is not None and hit.attr is attr:
+            return hit
+        return self.compile_hitattr(attr)
+
+    def hitattr_make(self, name, base, group, aseq, attr, onhit=None):
+        hit = self.hitattr(attr)
+        self.ctx.logs.log_hitattr(name, hit.attr_str)
+        hitmods = self.actmods(name)
+        if hit.dmg is not None:
+            src = hit.src
+            if src is None or src.name != name:
+                # attrs are interned at config by the name that uses them, this covers shared ones
+                src = hit.src = self.ctx.logs.source(name)
+            for mod in hit.mods:
+                hitmods.append(mod(name))
+            if hit.fade is not None:
+                attenuation = (hit.fade, self.conf.attenuation.hits, hitmods)
+            else:
+                attenuation = None
+            for m in hitmods:
+                m.on()
+            if hit.extra is not None:
+                for _ in range(min(hit.extra, round(self.buffcount))):
+                    self.add_combo(name)
+                    self.dmg_make(name, hit.dmg, attenuation=attenuation, src=src)
+            else:
+                self.add_combo(name)
+                self.dmg_make(name, hit.dmg, attenuation=attenuation, src=src)
+
+        if onhit:
+            onhit(name, base, group, aseq)
+
+        for step in hit.steps:
+            step(name, base, group, aseq)
 
         for m in hitmods:
             m.off()
 
+    def hitattr_afflic(self, name, aff_type, aff_args, fleet_args):
+        getattr(self.afflics, aff_type).on(name, *aff_args)
+        if self.conf['fleet']:
+            for _ in range(self.conf['fleet']):
+                getattr(self.afflics, aff_type).on(name, *fleet_args)
+
+    def hitattr_bleed(self, base, rate, mod):
+        rate = max(min(100, rate + self.sub_mod('debuff_rate', 'passive') * 100), 0)
+        debufftime = self.mod('debuff', operator=operator.add)
+        if self.conf.mbleed or (rate < 100 and base[0] == 's' and self.a_s_dict[base].owner is not None):
+            from module.bleed import mBleed
+            if self.bleed is None:
+                self.bleed = mBleed('init', mod)
+                self.bleed.reset()
+            self.bleed = mBleed(base, mod, chance=rate/100, debufftime=debufftime)
+            self.bleed.on()
+        else:
+            from module.bleed import Bleed
+            if self.bleed is None:
+                self.bleed = Bleed('init', mod)
+                self.bleed.reset()
+            if rate == 100 or rate >= self.ctx.rng.uniform(0, 100):
+                self.bleed = Bleed(base, mod, debufftime=debufftime)
+                self.bleed.on()
+
     def hitattr_buff_outer(self, name, base, group, aseq, attr):
             bctrl = None
             blist = attr['buff']
@@ -1927,23 +2123,25 @@ class Adv(object):
         'hp>=': lambda s, v: s.hp >= v,
         'hp<': lambda s, v: s.hp < v,
         'hp<=': lambda s, v: s.hp <= v,
-        'rng': lambda s, v: random.random() <= v,
+        'rng': lambda s, v: s.ctx.rng.random() <= v,
         'hits': lambda s, v: s.hits >= v
     }
     def do_hitattr_make(self, e, aseq, attr, pin=None):
-        if 'cond' in attr:
-            condtype, condval = attr['cond']
+        hit = self.hitattr(attr)
+        if hit.cond is not None:
+            condtype, condval = hit.cond
             if not Adv.ATTR_COND[condtype](self, condval):
                 return
-        iv = attr.get('iv', 0)
-        if not attr.get('nospd'):
+        iv = hit.iv
+        if not hit.nospd:
             iv /= self.speed()
         try:
-            onhit = getattr(self, f'{e.name}_hit{aseq+1}')
-        except AttributeError:
-            onhit = None
+            onhit = self.hit_callbacks[(e.name, aseq)]
+        except KeyError:
+            onhit = getattr(self, f'{e.name}_hit{aseq+1}', None)
+            self.hit_callbacks[(e.name, aseq)] = onhit
         if iv is not None and iv > 0:
-            mt = Timer(self.l_hitattr_make)
+            mt = HitTimer.get(self.l_hitattr_make)
             mt.pin = pin
             mt.name = e.name
             mt.base = e.base
@@ -1962,7 +2160,7 @@ class Adv(object):
             mt.proc = None
             mt.actmod = False
             mt.on(iv)
-            if not attr.get('msl'):
+            if not hit.msl:
                 self.action.getdoing().add_delayed(mt)
             return mt
         else:
@@ -2019,8 +2217,11 @@ class Adv(object):
         if e.name in ('ds', 'ds_final'):
             return
         self.actmod_on(e)
-        prev = self.action.getprev().name
-        log('cast', e.name, f'after {prev}', ', '.join([f'{s.charged}/{s.sp}' for s in self.skills]))
+        if self.ctx.logs.keep_record:
+            prev = self.action.getprev().name
+            log('cast', e.name, f'after {prev}', ', '.join([f'{s.charged}/{s.sp}' for s in self.skills]))
+        else:
+            log('cast', e.name)
         self.hit_make(e, self.conf[e.name], cb_kind=e.base)
 
     def l_repeat(self, e):
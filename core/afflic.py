@@ -25,22 +25,23 @@ class Dot(object):
         self.true_dmg_event.comment = ''
         self.tick_dmg = 0
         self.quickshot_event = Event('dmg_formula')
-        self.tick_timer = Timer(self.tick_proc)
+        # ticks share timeline entries with every other dot ticking at the same time
+        self.ticks = SimContext.active.ticks
         self.dotend_timer = Timer(self.dot_end_proc)
 
     def dot_end_proc(self, t):
         log('dot', self.name, 'end')
         self.active = 0
-        self.tick_timer.off()
+        self.ticks.cancel(self.tick_proc)
         self.cb_end()
 
     def cb_end(self):
         pass
 
-    def tick_proc(self, t):
+    def tick_proc(self):
         if self.active == 0:
             return
-        t.on(self.iv)
+        self.ticks.schedule(self.tick_proc, self.iv)
         self.true_dmg_event.count = self.tick_dmg
         self.true_dmg_event.on()
 
@@ -55,18 +56,19 @@ class Dot(object):
             log('dot', self.name, 'failed')
             return 0
         self.active = 1
-        self.tick_timer.on(self.iv)
+        self.ticks.schedule(self.tick_proc, self.iv)
         self.dotend_timer.on(self.duration)
         self.quickshot_event.dmg_coef = self.coef
         self.quickshot_event.dname = self.name
         self.quickshot_event.dtype = self.dtype if self.dtype else self.name
         self.quickshot_event()
         self.tick_dmg = self.quickshot_event.dmg
-        log('dot', self.name, 'start', '%f/%d' % (self.iv, self.duration))
+        if log_enabled():
+            log('dot', self.name, 'start', '%f/%d' % (self.iv, self.duration))
         return 1
 
     def off(self):
-        self.tick_timer.off()
+        self.ticks.cancel(self.tick_proc)
         self.dotend_timer.off()
         log('dot', self.name, 'end by other reason')
 
@@ -130,7 +132,7 @@ class AfflicBase:
         prev_r, prev_t = self.c_uptime
         rate = prev_r + next_r*(next_t-prev_t)
         self.c_uptime = (rate, next_t)
-        if next_t > 0 and rate > 0:
+        if next_t > 0 and rate > 0 and log_enabled():
             log('{}_uptime'.format(self.name), '{:.2f}/{:.2f}'.format(rate, next_t), '{:.2%}'.format(rate/next_t))
         # if next_t > 0 and rate > 0:
         #     log('uptime', self.name, rate / next_t)
@@ -184,22 +186,36 @@ class AfflicUncapped(AfflicBase):
 
 
 class AfflicCapped(AfflicBase):
-    State = namedtuple('State', ('timers', 'resist'))
+    """
+    Tracks a distribution over states of (end times of the running stacks, resist).
+    Stacks are kept by when they end rather than by their timer, so states that
+    only differ in which proc started them merge. With an epsilon (conf afflict_epsilon,
+    off by default) states under it are folded into the likeliest state with the same
+    stacks (or dropped when there is none), the probability moved that way adds up in pruned.
+    """
+    State = namedtuple('State', ('ends', 'resist'))
+    EPSILON = 0
 
     def __init__(self, name=None, duration=12, tolerance=0.2):
         super().__init__(name, duration, tolerance)
         self.stack_cap = 1
+        self.epsilon = AfflicCapped.EPSILON
+        self.pruned = 0.0
+        self.next_end = None
 
     def update(self):
         self.uptime()
+        t = now()
+        if self.next_end is not None and self.next_end <= t:
+            states = defaultdict(lambda: 0.0)
+            for state, state_p in self.states.items():
+                states[self.State(tuple(end for end in state.ends if end > t), state.resist)] += state_p
+            self.states = states
+            self.next_end = min((end for state in states for end in state.ends), default=None)
         total_p = 0.0
-        states = defaultdict(lambda: 0.0)
         for state, state_p in self.states.items():
-            reduced_state = self.State(frozenset([t for t in state.timers if t.timing > now()]), state.resist)
-            states[reduced_state] += state_p
-            if reduced_state.timers:
+            if state.ends:
                 total_p += state_p
-        self.states = states
         self._get = total_p
         log('affliction', self.name, self.get())
         return total_p
@@ -209,21 +225,33 @@ class AfflicCapped(AfflicBase):
         if self.get() != self.start_rate:
             log('cc', self.name, self.get() or 'end')
 
+    def prune(self):
+        by_ends = defaultdict(list)
+        for state, state_p in self.states.items():
+            by_ends[state.ends].append((state_p, state))
+        for group in by_ends.values():
+            keep_p, keep = max(group, key=lambda sp: sp[0])
+            for state_p, state in group:
+                if state_p < self.epsilon and (state is not keep or keep_p < self.epsilon):
+                    del self.states[state]
+                    self.pruned += state_p
+                    if keep_p >= self.epsilon:
+                        self.states[keep] += state_p
+
     def on(self):
         timer = Timer(self.stack_end, self.duration).on()
         if self.states is None:
             self.states = defaultdict(lambda: 0.0)
-            self.states[self.State(frozenset(), self.resist)] = 1.0
+            self.states[self.State((), self.resist)] = 1.0
         states = defaultdict(lambda: 0.0)
         total_p = 0.0
         for start_state, start_state_p in self.states.items():
             res = start_state.resist - self.res_modifier
-            if res >= self.rate or res >= 1 or len(start_state.timers) >= self.stack_cap:
+            if res >= self.rate or res >= 1 or len(start_state.ends) >= self.stack_cap:
                 states[start_state] += start_state_p
             else:
                 rate_after_res = min(1, self.rate - res)
-                succeed_timers = frozenset(list(start_state.timers) + [timer])
-                state_on_succeed = self.State(succeed_timers, min(1.0, res + self.tolerance))
+                state_on_succeed = self.State(tuple(sorted(start_state.ends + (timer.timing,))), min(1.0, res + self.tolerance))
                 overall_succeed_p = start_state_p * rate_after_res
                 overall_fail_p = start_state_p * (1.0 - rate_after_res)
                 total_p += overall_succeed_p
@@ -231,6 +259,10 @@ class AfflicCapped(AfflicBase):
                 if overall_fail_p > 0:
                     states[start_state] += overall_fail_p
         self.states = states
+        if self.epsilon > 0:
+            self.prune()
+        if total_p > 0 and (self.next_end is None or timer.timing < self.next_end):
+            self.next_end = timer.timing
         self.update()
 
         self.event.rate = total_p
@@ -364,6 +396,20 @@ class Afflics(object):
         for aff, resist in Afflics.RESIST_PROFILES[profile].items():
             getattr(self, aff).resist = resist
 
+    def set_epsilon(self, epsilon):
+        for atype in AFFLICT_LIST:
+            aff = self.__dict__[atype]
+            if isinstance(aff, AfflicCapped):
+                aff.epsilon = epsilon
+
+    def get_pruned(self):
+        pruned = {}
+        for atype in AFFLICT_LIST:
+            p = getattr(self.__dict__[atype], 'pruned', 0)
+            if p > 0:
+                pruned[atype] = p
+        return pruned
+
     def get_uptimes(self):
         uptimes = {}
         for atype in AFFLICT_LIST:
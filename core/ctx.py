@@ -1,71 +1,57 @@
 import copy
-
-class Ctx(object):
-    _active = [None]
-    _gdict_s = []
-    _vdict_s = []
+import random
+
+class SimContext(object):
+    """
+    Owns the state of one simulation: clock, timeline and periodic ticks, event listeners, logs,
+    and the namespaces behind every Static (modifier registry, buffs, actions...)
+    Activating a context is a pointer swap, so many can live in one process.
+    Every random draw of the simulation goes through rng, seeded by the caller.
+    """
+    active = None
+    _statics = []
 
     @classmethod
-    def register(cls, gdict, vdict):
-        cls._gdict_s.append(gdict)
-        cls._vdict_s.append(vdict)
-        if cls._active[0] != None:
-            for k in vdict:
-                gdict[k] = vdict[k]
-            cls._active[0].__init__()
-
-
-    def __init__(self):
-        self.ctxdict_s = copy.deepcopy(self._vdict_s)
-
-
-    def __upload(self):
-        for i in range(len(self.ctxdict_s)):
-            gdict = self._gdict_s[i]
-            vdict = self.ctxdict_s[i]
-            for k in vdict:
-                gdict[k] = vdict[k]
-        return self
-
-
-    def __download(self):
-        for i in range(len(self.ctxdict_s)):
-            gdict = self._gdict_s[i]
-            vdict = self.ctxdict_s[i]
-            for k in vdict:
-                vdict[k] = gdict[k]
-        return self
-
+    def register(cls, static, default):
+        cls._statics.append((static, default))
+        if cls.active is not None:
+            static.__dict__ = cls.active.namespace(static, default)
+
+    def __init__(self, seed=None, log_sink='full'):
+        from core.timeline import Timeline, TickScheduler
+        from core.log import Log
+        self.now = 0
+        self.stop = 0
+        self.event_listeners = {}
+        self.count_events = False
+        self.timeline = Timeline(self)
+        self.ticks = TickScheduler(self)
+        self.logs = Log(log_sink)
+        self.statics = {}
+        self.seed = seed
+        self.rng = random.Random(seed)
+
+    def namespace(self, static, default):
+        try:
+            return self.statics[static]
+        except KeyError:
+            ns = {k: copy.copy(v) for k, v in default.items()}
+            self.statics[static] = ns
+            return ns
 
     def on(self):
-        if self._active[0] == None:
-            self._active[0] = self
-            self.__upload()
-        else:
-            self._active[0].__download()
-            self.__upload()
-            self._active[0] = self
+        if SimContext.active is not self:
+            for static, default in self._statics:
+                static.__dict__ = self.namespace(static, default)
+            SimContext.active = self
         return self
 
-
-    def off(self):
-        if self._active[0] != self:
-            print('try to turn off inactive ctx')
-        for i in range(len(self.ctxdict_s)):
-            gdict = self._gdict_s[i]
-            vdict = self.ctxdict_s[i]
-            for k in vdict:
-                del(gdict[k])
-        self.__download()
-        self._active[0] = None
-        return self
-
-#} //class Ctx
+#} //class SimContext
 
 
 class Static(object):
     def __init__(self, default):
-        Ctx.register(self, default)
+        SimContext.register(self, default)
 
     def __getitem__(self, i):
         return self.__getattribute__(i)
@@ -78,4 +64,3 @@ class Static(object):
         del(v)
 
 #} //class Static
-
@@ -1,7 +1,7 @@
 import operator
 from core.advbase import Action, S
 from core.timeline import Event, Timer, now
-from core.log import log, g_logs
+from core.log import log, log_enabled
 from core.acl import allow_acl
 from math import ceil
 
@@ -75,7 +75,8 @@ class DragonForm(Action):
             delta_t = min(max_d, cur_d+delta_t) - cur_d
             if cur_d + delta_t > 0:
                 self.shift_end_timer.add(delta_t)
-                log('shift_time', f'{delta_t:+2.4}', f'{cur_d+delta_t:2.4}')
+                if log_enabled():
+                    log('shift_time', f'{delta_t:+2.4}', f'{cur_d+delta_t:2.4}')
             else:
                 self.d_shift_end(None)
                 self.shift_end_timer.off()
@@ -172,7 +173,7 @@ class DragonForm(Action):
             self.d_dragondrive_end('<gauge deplete>')
         else:
             self.dragon_gauge = (duration/max_duration)*self.max_gauge
-            if add_time != 0:
+            if add_time != 0 and log_enabled():
                 log('drive_time' if not skill_pause else 'skill_pause', f'{add_time:+2.4}', f'{duration:2.4}', f'{int(self.dragon_gauge)}/{int(self.max_gauge)}')
 
     def charge_gauge(self, value, utp=False, dhaste=True, auto=False):
@@ -185,10 +186,11 @@ class DragonForm(Action):
             self.add_drive_gauge_time(delta)
         elif delta != 0:
             self.dragon_gauge += delta
-            if utp:
-                log('dragon_gauge', '{:+} utp'.format(int(delta)), f'{int(self.dragon_gauge)}/{int(self.max_gauge)}', value)
-            else:
-                log('auto_gauge' if auto else 'dragon_gauge', '{:+.2f}%'.format(delta/self.max_gauge*100), '{:.2f}%'.format(self.dragon_gauge/self.max_gauge*100))
+            if log_enabled():
+                if utp:
+                    log('dragon_gauge', '{:+} utp'.format(int(delta)), f'{int(self.dragon_gauge)}/{int(self.max_gauge)}', value)
+                else:
+                    log('auto_gauge' if auto else 'dragon_gauge', '{:+.2f}%'.format(delta/self.max_gauge*100), '{:.2f}%'.format(self.dragon_gauge/self.max_gauge*100))
         return value
 
     @allow_acl
@@ -216,7 +218,8 @@ class DragonForm(Action):
             self.skill_spc += self.adv.sp_convert(self.adv.sp_mod('x'), value)
             if self.skill_spc > self.skill_sp:
                 self.skill_spc = self.skill_sp
-            log(self.c_act_name, 'sp', f'{self.skill_spc}/{self.skill_sp}')
+            if log_enabled():
+                log(self.c_act_name, 'sp', f'{self.skill_spc}/{self.skill_sp}')
 
     def ds_reset(self):
         self.skill_use = self.conf.ds.uses
@@ -234,12 +237,13 @@ class DragonForm(Action):
             self.act_list = ['end']
             return False
         duration = now()-self.shift_start_time
-        shift_dmg = g_logs.shift_dmg
-        g_logs.log_shift_dmg(False)
+        shift_dmg = self.adv.ctx.logs.shift_dmg
+        self.adv.ctx.logs.log_shift_dmg(False)
         count = self.clear_delayed()
-        if count > 0:
+        if count > 0 and log_enabled():
             log('cancel', self.c_act_name, f'by shift end', f'lost {count} hit{"s" if count > 1 else ""}')
-        log(self.name, '{:.2f}dmg / {:.2f}s, {:.2f} dps'.format(shift_dmg, duration, shift_dmg/duration), ' '.join(self.act_sum))
+        if log_enabled():
+            log(self.name, '{:.2f}dmg / {:.2f}s, {:.2f} dps'.format(shift_dmg, duration, shift_dmg/duration), ' '.join(self.act_sum))
         self.act_sum = []
         self.act_list = []
         if self.off_ele_mod is not None:
@@ -367,7 +371,7 @@ class DragonForm(Action):
         if self.has_delayed and nact == 'dsf':
             nact = 'ds'
             count = self.clear_delayed()
-            if count > 0:
+            if count > 0 and log_enabled():
                 log('cancel', self.c_act_name, f'by {nact}', f'lost {count} hit{"s" if count > 1 else ""}')
             return self.act_timer(self.d_act_start_t, self.conf.latency, nact)
         if nact in ('ds', 'dsf', 'dodge') or (nact == 'end' and self.c_act_name not in ('ds', 'ds_final', 'dshift')): # cancel
@@ -429,10 +433,12 @@ class DragonForm(Action):
             if dryrun == False:
                 if doing.status == Action.STARTUP:
                     doing.startup_timer.off()
-                    log('interrupt', doing.name , 'by '+self.name, 'after {:.2f}s'.format(now()-doing.startup_start))
+                    if log_enabled():
+                        log('interrupt', doing.name , 'by '+self.name, 'after {:.2f}s'.format(now()-doing.startup_start))
                 elif doing.status == Action.RECOVERY:
                     doing.recovery_timer.off()
-                    log('cancel', doing.name , 'by '+self.name, 'after {:.2f}s'.format(now()-doing.recover_start))
+                    if log_enabled():
+                        log('cancel', doing.name , 'by '+self.name, 'after {:.2f}s'.format(now()-doing.recover_start))
         return True
 
     def __call__(self):
@@ -444,7 +450,10 @@ class DragonForm(Action):
                 self.d_dragondrive_end('<turn off>')
                 return True
             else:
-                log('cast', 'dragondrive', self.name, f'base duration {self.dragon_gauge/self.drain:.4}s')
+                if log_enabled():
+                    log('cast', 'dragondrive', self.name, f'base duration {self.dragon_gauge/self.drain:.4}s')
+                else:
+                    log('cast', 'dragondrive')
                 self.dragondrive_timer.on(self.dragon_gauge/self.drain)
                 self.dragondrive_buff.on()
         else:
@@ -460,7 +469,7 @@ class DragonForm(Action):
         self.shift_count += 1
         self.status = Action.STARTUP
         self._setdoing()
-        g_logs.log_shift_dmg(True)
+        self.adv.ctx.logs.log_shift_dmg(True)
         self.shift_start_time = now()
         self.shift_end_timer.on(self.dtime())
         self.reset_allow_end()
@@ -1,19 +1,78 @@
 import sys
 from collections import defaultdict
-import core.timeline
+from core.ctx import SimContext
 
 def hecc():
     return {}
 
+DAMAGE_CATEGORIES = ('x', 's', 'f', 'd', 'o')
+
+class DamageSource(object):
+    """
+    A damage source name interned by Log.source
+    Holds what used to be re-parsed from the name on every hit: the report category and key,
+    the name written to the record, the dmg_mod scope, and the accumulator slots
+    dmg_scope is the adv's (mod type, mod) for it, filled by Adv.dmg_mod on first use
+    """
+    __slots__ = ('sid', 'name', 'cat', 'key', 'record_name', 'shift', 'scope', 'slot', 'dmg_scope')
+
+    def __init__(self, sid, name):
+        self.sid = sid
+        self.name = name
+        key = name
+        if key[0:2] == 'o_' and key[2:3] in DAMAGE_CATEGORIES:
+            key = key[2:]
+        if key[0] in DAMAGE_CATEGORIES:
+            self.cat = key[0]
+        else:
+            if key[0] == '#':
+                key = key[1:]
+            self.cat = 'o'
+        self.key = key
+        self.record_name = key if name[0] == '#' else name
+        self.shift = key[0:1] == 'd'
+        scope = name.split('_')
+        scope = scope[1] if scope[0] == 'o' and len(scope) > 1 else scope[0]
+        if name.startswith('dx') or name == 'dshift':
+            scope = 'x'
+        elif name in ('ds', 'ds_final'):
+            scope = 's'
+        self.scope = scope
+        self.slot = None
+        self.dmg_scope = None
+
 class Log:
     DEBUG = False
-    def __init__(self):
+    # sinks, what a Log keeps
+    FULL = 'full'           # every record, plus everything below
+    CHART = 'chart'         # datasets for charts, plus everything below
+    SUMMARY = 'summary'     # damage/counts/team_* accumulators only
+    def __init__(self, sink=FULL):
+        self.set_sink(sink)
+        # interned damage sources, they outlive reset so config time interning holds for the run
+        self.sources = {}
+        self.source_list = []
+        self.slot_keys = []
+        self.slot_dict = {}
         self.reset()
 
+    def set_sink(self, sink):
+        if sink not in (Log.FULL, Log.CHART, Log.SUMMARY):
+            raise ValueError(f'Unknown log sink {sink}')
+        self.sink = sink
+        # callers check keep_record before formatting anything that only goes in the record
+        self.keep_record = sink == Log.FULL
+        self.keep_datasets = sink != Log.SUMMARY
+
     def reset(self):
         self.record = []
-        self.damage = {'x':{},'s':{},'f':{},'d':{},'o':{}}
-        self.counts = {'x':{},'s':{},'f':{},'d':{},'o':{}}
+        # damage per slot and counts per source id, None/0 until the first hit
+        self.dmg_acc = [None] * len(self.slot_keys)
+        self.dmg_order = []
+        self.count_acc = [0] * len(self.source_list)
+        self.count_order = []
+        self._damage = None
+        self._counts = None
         self.datasets = defaultdict(hecc)
         self.p_buff = None
         self.team_buff = 0
@@ -23,6 +82,42 @@ class Log:
         self.hitattr_set = set()
         self.shift_dmg = None
 
+    def source(self, name):
+        """intern a damage source name, new names get the next id and their report slot"""
+        try:
+            return self.sources[name]
+        except KeyError:
+            src = DamageSource(len(self.source_list), name)
+            try:
+                src.slot = self.slot_dict[(src.cat, src.key)]
+            except KeyError:
+                src.slot = len(self.slot_keys)
+                self.slot_dict[(src.cat, src.key)] = src.slot
+                self.slot_keys.append((src.cat, src.key))
+                self.dmg_acc.append(None)
+            self.sources[name] = src
+            self.source_list.append(src)
+            self.count_acc.append(0)
+            return src
+
+    @property
+    def damage(self):
+        if self._damage is None:
+            self._damage = {cat: {} for cat in DAMAGE_CATEGORIES}
+            for slot in self.dmg_order:
+                cat, key = self.slot_keys[slot]
+                self._damage[cat][key] = self.dmg_acc[slot]
+        return self._damage
+
+    @property
+    def counts(self):
+        if self._counts is None:
+            self._counts = {cat: {} for cat in DAMAGE_CATEGORIES}
+            for sid in self.count_order:
+                name = self.source_list[sid].name
+                self._counts[name[0]][name] = self.count_acc[sid]
+        return self._counts
+
     def convert_dataset(self):
         if 'doublebuff' in self.datasets:
             converted_doublebuff = {}
@@ -62,58 +157,73 @@ class Log:
         else:
             self.shift_dmg = None
 
-    def log_hitattr(self, name, attr):
-        attr_str = Log.fmt_hitattr(attr)
+    def log_hitattr(self, name, attr_str):
+        if not self.keep_record:
+            return None
         if (name, attr_str) in self.hitattr_set:
             return
         self.hitattr_set.add((name, attr_str))
-        log('hitattr', name, attr_str)
+        self.log('hitattr', name, attr_str)
         return attr_str
 
     def log(self, *args):
-        time_now = core.timeline.now()
-        n_rec = [time_now, *args]
+        time_now = SimContext.active.now
+        n_rec = [time_now, *args] if self.keep_record else None
         if len(args) >= 2:
             category = args[0]
             name = args[1]
             if category == 'dmg':
-                dmg_amount = float(args[2])
-                if name[0:2] == 'o_' and name[2] in self.damage:
-                    name = name[2:]
-                if name[0] in self.damage:
-                    self.update_dict(self.damage[name[0]], name, dmg_amount)
-                else:
-                    if name[0] == '#':
-                        name = name[1:]
-                        n_rec[2] = name
-                    self.update_dict(self.damage['o'], name, dmg_amount)
-                if name[0] == 'd' and self.shift_dmg is not None:
-                    self.shift_dmg += dmg_amount
-                self.update_dict(self.datasets['dmg'], time_now, dmg_amount)
+                # hits made by Adv.dmg_make carry the interned source already
+                src = name if isinstance(name, DamageSource) else self.source(name)
+                self.log_dmg(src, float(args[2]), time_now)
+                if n_rec is not None:
+                    n_rec[2] = src.record_name
             elif category == 'x' or category == 'cast':
-                self.update_dict(self.counts[name[0]], name, 1)
+                sid = self.source(name).sid
+                self._counts = None
+                if not self.count_acc[sid]:
+                    self.count_order.append(sid)
+                self.count_acc[sid] += 1
                 # name1 = name.split('_')[0]
                 # if name1 != name:
                 #     self.update_dict(self.counts[name[0]], name1, 1)
-                self.act_seq.append(name)
+                if self.keep_record:
+                    self.act_seq.append(name)
             elif category == 'buff' and name == 'team':
                 buff_amount = float(args[2])
                 if self.p_buff is not None:
                     pt, pb = self.p_buff
                     self.team_buff += (time_now - pt) * pb
                 self.p_buff = (time_now, buff_amount)
-                self.update_dict(self.datasets['team'], time_now, buff_amount, replace=True)
+                if self.keep_datasets:
+                    self.update_dict(self.datasets['team'], time_now, buff_amount, replace=True)
             elif category == 'buff' and name == 'doublebuff':
                 self.team_doublebuffs += 1
-                self.update_dict(self.datasets['doublebuff'], time_now, 1)
-                self.update_dict(self.datasets['doublebuff'], time_now + float(args[2]), -1)
+                if self.keep_datasets:
+                    self.update_dict(self.datasets['doublebuff'], time_now, 1)
+                    self.update_dict(self.datasets['doublebuff'], time_now + float(args[2]), -1)
             elif category in ('energy', 'inspiration') and name == 'team':
                 self.update_dict(self.team_tension, category, float(args[2]))
-            elif category == 'affliction':
+            elif category == 'affliction' and self.keep_datasets:
                 self.update_dict(self.datasets[name], time_now, float(args[2])*100)
-        if self.DEBUG:
-            self.write_log_entry(n_rec, sys.stdout, flush=True)
-        self.record.append(n_rec)
+        if n_rec is not None:
+            if self.DEBUG:
+                self.write_log_entry(n_rec, sys.stdout, flush=True)
+            self.record.append(n_rec)
+
+    def log_dmg(self, src, dmg_amount, time_now):
+        slot = src.slot
+        acc = self.dmg_acc[slot]
+        self._damage = None
+        if acc is None:
+            self.dmg_order.append(slot)
+            self.dmg_acc[slot] = dmg_amount
+        else:
+            self.dmg_acc[slot] = acc + dmg_amount
+        if src.shift and self.shift_dmg is not None:
+            self.shift_dmg += dmg_amount
+        if self.keep_datasets:
+            self.update_dict(self.datasets['dmg'], time_now, dmg_amount)
 
     def filter_iter(self, log_filter):
         for entry in self.record:
@@ -151,8 +261,9 @@ class Log:
 
 loglevel = 0
 
-g_logs = Log()
-log = g_logs.log
-logcat = g_logs.write_logs
-logget = g_logs.get_log_list
-logreset = g_logs.reset
\ No newline at end of file
+def log(*args):
+    SimContext.active.logs.log(*args)
+
+def log_enabled():
+    # False when the active log won't keep records, so callers can skip building them
+    return SimContext.active.logs.keep_record
@@ -5,39 +5,122 @@ import operator
 import copy
 
 from core.timeline import Timer, Event, Listener, now
-from core.log import log
+from core.log import log, log_enabled
 from core.ctx import Static
 from core.acl import allow_acl
 
 
 class ModifierDict(defaultdict):
+    """
+    Modifiers by type then order.
+    Sums are cached per (type, order) and dropped when that order gains or loses
+    a modifier, or when a modifier in it changes how it evaluates (see
+    Modifier.__setattr__ and Buff.changed). Static modifiers, plain ones without
+    get callable or condition and those backed by Buff.get, are cached by value,
+    the others are called again on every sum.
+    Each order holds its modifiers as the keys of a dict, so they come out in
+    the order they were added (like a list would) but are removed in O(1).
+    A modifier can only be in an order once, appending it again is an error.
+    Sums keep that order so results do not change.
+    """
     def __init__(self, *args, **kwargs):
         if args:
             super().__init__(*args, **kwargs)
         else:
-            super().__init__(lambda: defaultdict(lambda: []))
+            super().__init__(lambda: defaultdict(dict))
+        # bumped on every change to the modifiers
+        self.version = 0
+        # (mtype, morder) -> (values, dynamic [(idx, get)], sum if all static else None)
+        self._sub_mods = {}
+        # mtype -> {(operator, initial): (number of orders, mod)}
+        self._mods = {}
+
+    def __copy__(self):
+        return ModifierDict(self.default_factory, self)
+
+    def append(self, modifier, mtype=None):
+        mtype = mtype or modifier.mod_type
+        bucket = self[mtype][modifier.mod_order]
+        if modifier in bucket:
+            # a list counted it twice, a dict would silently count it once
+            raise ValueError(f'{modifier} is already in {mtype}')
+        bucket[modifier] = None
+        self.changed(mtype, modifier.mod_order)
+
+    def remove(self, modifier, mtype=None):
+        mtype = mtype or modifier.mod_type
+        del self[mtype][modifier.mod_order][modifier]
+        self.changed(mtype, modifier.mod_order)
+
+    def changed(self, mtype, morder):
+        self.version += 1
+        self._sub_mods.pop((mtype, morder), None)
+        self._mods.pop(mtype, None)
 
-    def append(self, modifier):
-        self[modifier.mod_type][modifier.mod_order].append(modifier)
-
-    def remove(self, modifier):
-        self[modifier.mod_type][modifier.mod_order].remove(modifier)
+    @staticmethod
+    def is_static(modifier):
+        try:
+            get = modifier.__dict__['get']
+        except KeyError:
+            return (
+                type(modifier).get is Modifier.get
+                and modifier.mod_get is None
+                and modifier.mod_condition is None
+            )
+        return getattr(get, '__func__', None) is Buff.get
 
     @staticmethod
     def mod_mult(a, b):
         return a * (1 + b)
 
     def mod(self, mtype, operator=None, initial=1):
-        operator = operator or ModifierDict.mod_mult
-        return reduce(operator, [self.sub_mod(mtype, order) for order in self[mtype].keys()], initial)
+        orders = self[mtype]
+        try:
+            n_orders, mod = self._mods[mtype][(operator, initial)]
+            if n_orders == len(orders):
+                return mod
+        except KeyError:
+            pass
+        sub_mods = [self._sub_mod(mtype, order) for order in orders.keys()]
+        mod = reduce(operator or ModifierDict.mod_mult, [mod_sum for mod_sum, _ in sub_mods], initial)
+        if all(static for _, static in sub_mods):
+            self._mods.setdefault(mtype, {})[(operator, initial)] = (len(orders), mod)
+        return mod
 
     def sub_mod(self, mtype, morder):
-        mod_sum = sum([modifier.get() for modifier in self[mtype][morder]])
+        return self._sub_mod(mtype, morder)[0]
+
+    def _sub_mod(self, mtype, morder):
+        # (sum, whether it is cached)
+        try:
+            values, dynamic, mod_sum = self._sub_mods[(mtype, morder)]
+        except KeyError:
+            values = []
+            dynamic = []
+            for idx, modifier in enumerate(self[mtype][morder]):
+                if self.is_static(modifier):
+                    values.append(modifier.get())
+                else:
+                    values.append(0)
+                    dynamic.append((idx, modifier.get))
+            mod_sum = None
+            if not dynamic:
+                mod_sum = sum(values)
+                if morder == 'buff':
+                    mod_sum = min(mod_sum, 2.00)
+            self._sub_mods[(mtype, morder)] = (values, dynamic, mod_sum)
+        if mod_sum is not None:
+            return mod_sum, True
+        values = values.copy()
+        for idx, get in dynamic:
+            values[idx] = get()
+        mod_sum = sum(values)
         if morder == 'buff':
             mod_sum = min(mod_sum, 2.00)
-        return mod_sum
+        return mod_sum, False
 
 class Modifier(object):
+    EVAL_ATTRS = {'mod_value', 'mod_get', 'mod_condition', 'get'}
     _static = Static({
         'all_modifiers': ModifierDict(),
         'g_condition': None,
@@ -77,6 +160,16 @@ class Modifier(object):
             return 0
         return self.mod_value
 
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+        # drop the cached sums this modifier is part of
+        if name in Modifier.EVAL_ATTRS and self.__dict__.get('_mod_active'):
+            if name != 'mod_value' or ModifierDict.is_static(self):
+                self.changed()
+
+    def changed(self):
+        self._static.all_modifiers.changed(self.mod_type, self.mod_order)
+
     def on(self, modifier=None):
         if self._mod_active == 1:
             return self
@@ -127,7 +220,7 @@ class KillerModifier(Modifier):
                 return self
 
         for kcondition in self.killer_condition:
-            self._static.all_modifiers[f"{kcondition}_killer"][self.mod_order].append(modifier)
+            self._static.all_modifiers.append(modifier, f"{kcondition}_killer")
 
         self._mod_active = 1
         return self
@@ -139,9 +232,13 @@ class KillerModifier(Modifier):
         if modifier == None:
             modifier = self
         for kcondition in self.killer_condition:
-            self._static.all_modifiers[f"{kcondition}_killer"][self.mod_order].remove(self)
+            self._static.all_modifiers.remove(self, f"{kcondition}_killer")
         return self
 
+    def changed(self):
+        for kcondition in self.killer_condition:
+            self._static.all_modifiers.changed(f"{kcondition}_killer", self.mod_order)
+
 
 class CrisisModifier(Modifier):
     def __init__(self, name, scale, hp):
@@ -168,14 +265,111 @@ class CrisisModifier(Modifier):
         return super().on()
 
 
+class BuffIndex(object):
+    """
+    all_buffs by name, bufftype and mod_type, so buff queries do not walk every
+    buff stored during the run.
+    stored mirrors all_buffs, active only holds the buffs that are on. Buffs
+    that take their get from a modifier do not follow on/off, they stay active
+    until unstored and are kept in dynamic as well: their get may evaluate
+    conditions (and so change hp), see scan.
+    Keys are taken when a buff is first stored, bufftype may still change after
+    that (see Buff.bufftype).
+    """
+    KEYS = ('name', 'bufftype', 'mod_type')
+
+    def __init__(self):
+        self.seq = 0
+        self.live = set()
+        self.dynamic = set()
+        self.stored = tuple(defaultdict(dict) for _ in BuffIndex.KEYS)
+        self.active = tuple(defaultdict(dict) for _ in BuffIndex.KEYS)
+
+    def __copy__(self):
+        return BuffIndex()
+
+    def store(self, buff):
+        buff.index_seq = self.seq
+        self.seq += 1
+        buff.index_keys = tuple(getattr(buff, key) for key in BuffIndex.KEYS)
+        for index, value in zip(self.stored, buff.index_keys):
+            index[value][buff] = None
+        if 'get' in buff.__dict__:
+            self.dynamic.add(buff)
+
+    def unstore(self, buff):
+        self.off(buff)
+        self.dynamic.discard(buff)
+        for index, value in zip(self.stored, buff.index_keys):
+            del index[value][buff]
+        buff.index_keys = None
+
+    def on(self, buff):
+        if buff in self.live:
+            return
+        self.live.add(buff)
+        for index, value in zip(self.active, buff.index_keys):
+            index[value][buff] = None
+
+    def off(self, buff):
+        if buff not in self.live:
+            return
+        self.live.discard(buff)
+        for index, value in zip(self.active, buff.index_keys):
+            del index[value][buff]
+
+    def rekey(self, buff, key, value):
+        k = BuffIndex.KEYS.index(key)
+        old = buff.index_keys[k]
+        if old == value:
+            return
+        indexes = (self.stored[k], self.active[k]) if buff in self.live else (self.stored[k],)
+        for index in indexes:
+            del index[old][buff]
+            index[value][buff] = None
+        buff.index_keys = buff.index_keys[:k] + (value,) + buff.index_keys[k+1:]
+
+    def by_name(self, name):
+        return self.active[0].get(name, ())
+
+    def by_prefix(self, prefix):
+        for name, buffs in self.active[0].items():
+            if name.startswith(prefix):
+                yield from buffs
+
+    def by_bufftype(self, *bufftypes, stored=False):
+        index = self.stored[1] if stored else self.active[1]
+        return chain.from_iterable(index.get(bufftype, ()) for bufftype in bufftypes)
+
+    @staticmethod
+    def ordered(buffs):
+        # all_buffs order, sums and logs over the result depend on it
+        return sorted(buffs, key=operator.attrgetter('index_seq'))
+
+    def scan(self, buffs, ordered=True):
+        """
+        Stand in for all_buffs in a loop that calls get() on every buff before
+        its own checks: the candidates plus the dynamic buffs, in all_buffs
+        order, so conditions are evaluated as they would be over all_buffs.
+        The loop must still check what the candidates were picked by.
+        ordered=False skips the sort when there are no dynamic buffs, for
+        loops that only count.
+        """
+        if self.dynamic:
+            return self.ordered(self.dynamic.union(buffs))
+        return self.ordered(buffs) if ordered else buffs
+
+
 bufftype_dict = {}
 class Buff(object):
     MAXHP_CAP = 1.30
     _static = Static({
         'all_buffs': [],
+        'buff_index': BuffIndex(),
         'adv': None
     })
     DB_DURATION = 15 # usual doublebuff effect duration for offensive buffs, note that regen lasts 20s
+    index_keys = None
     def __init__(self, name='<buff_noname>', value=0, duration=0, mtype='att', morder=None, modifier=None, hidden=False, source=None):
         self.name = name
         self.__value = value
@@ -242,7 +436,8 @@ class Buff(object):
 
     def value(self, newvalue=None):
         if newvalue:
-            self.logwrapper(self.name, f'{self.mod_type}({self.mod_order}): {newvalue:.02f}', 'buff value change')
+            if log_enabled():
+                self.logwrapper(self.name, f'{self.mod_type}({self.mod_order}): {newvalue:.02f}', 'buff value change')
             return self.set(newvalue)
         else:
             return self.__value
@@ -254,30 +449,44 @@ class Buff(object):
         else:
             return 0
 
+    @property
+    def bufftype(self):
+        return self.__bufftype
+
+    @bufftype.setter
+    def bufftype(self, bufftype):
+        if self.index_keys is not None:
+            self._static.buff_index.rekey(self, 'bufftype', bufftype)
+        self.__bufftype = bufftype
+
     def set(self, v, d=None):
         self.__value = v
+        self.changed()
         if d != None:
             self.duration = d
         return self
 
     def stack(self):
         stack = 0
-        for i in self._static.all_buffs:
-            if i.name == self.name:
-                if i.__active != 0:
-                    stack += 1
+        for i in self._static.buff_index.by_name(self.name):
+            if i.__active != 0:
+                stack += 1
         return stack
 
     def valuestack(self):
         stack = 0
         value = 0
-        for i in self._static.all_buffs:
-            if i.name == self.name:
-                if i.__active != 0:
-                    stack += 1
-                    value += i.__value
+        for i in self._static.buff_index.ordered(self._static.buff_index.by_name(self.name)):
+            if i.__active != 0:
+                stack += 1
+                value += i.__value
         return value, stack
 
+    def changed(self):
+        # get is cached in the modifier sums, see ModifierDict.is_static
+        if self.modifier is not None:
+            self.modifier.changed()
+
     def effect_on(self):
         return self.modifier and self.modifier.on()
 
@@ -285,8 +494,10 @@ class Buff(object):
         return self.modifier and self.modifier.off()
 
     def buff_end_proc(self, e):
-        self.logwrapper(self.name, f'{self.mod_type}({self.mod_order}): {self.value():.02f}', 'buff end <timeout>')
+        if log_enabled():
+            self.logwrapper(self.name, f'{self.mod_type}({self.mod_order}): {self.value():.02f}', 'buff end <timeout>')
         self.__active = 0
+        self.changed()
 
         if self.__stored:
             idx = len(self._static.all_buffs)
@@ -297,10 +508,12 @@ class Buff(object):
                 if self == self._static.all_buffs[idx]:
                     self._static.all_buffs.pop(idx)
                     break
+            self._static.buff_index.unstore(self)
             self.__stored = 0
         value, stack = self.valuestack()
         if stack > 0:
-            self.logwrapper(self.name, f'{self.mod_type}({self.mod_order}): {value:.02f}', f'buff stack <{stack}>')
+            if log_enabled():
+                self.logwrapper(self.name, f'{self.mod_type}({self.mod_order}): {value:.02f}', f'buff stack <{stack}>')
         self.effect_off()
 
     def count_team_buff(self):
@@ -311,14 +524,14 @@ class Buff(object):
         self.dmg_test_event.modifiers = ModifierDict()
         for mod in base_mods:
             self.dmg_test_event.modifiers.append(mod)
-        for b in filter(lambda b: b.get() and b.bufftype == 'simulated_def', self._static.all_buffs):
+        for b in filter(lambda b: b.get() and b.bufftype == 'simulated_def', self._static.buff_index.scan(self._static.buff_index.by_bufftype('simulated_def'))):
             self.dmg_test_event.modifiers.append(b.modifier)
 
         self.dmg_test_event()
         no_team_buff_dmg = self.dmg_test_event.dmg
 
         placeholders = []
-        for b in filter(lambda b: b.get() and b.bufftype in ('team', 'debuff'), self._static.all_buffs):
+        for b in filter(lambda b: b.get() and b.bufftype in ('team', 'debuff'), self._static.buff_index.scan(self._static.buff_index.by_bufftype('team', 'debuff'))):
             placehold = None
             if b.modifier.mod_type == 's':
                 placehold = Modifier('placehold_sd', 'att', 'sd', b.modifier.get() / 2)
@@ -352,9 +565,12 @@ class Buff(object):
         d = max(-1, (duration or self.duration) * self.bufftime())
         if self.__active == 0:
             self.__active = 1
+            self.changed()
             if self.__stored == 0:
                 self._static.all_buffs.append(self)
+                self._static.buff_index.store(self)
                 self.__stored = 1
+            self._static.buff_index.on(self)
             if d >= 0:
                 self.buff_end_timer.on(d)
             proc_type = 'start'
@@ -363,10 +579,12 @@ class Buff(object):
                 self.buff_end_timer.on(d)
             proc_type = 'refresh'
 
-        self.logwrapper(self.name, f'{self.mod_type}({self.mod_order}): {self.value():.02f}', f'buff {proc_type} <{d:.02f}s>')
+        if log_enabled():
+            self.logwrapper(self.name, f'{self.mod_type}({self.mod_order}): {self.value():.02f}', f'buff {proc_type} <{d:.02f}s>')
         value, stack = self.valuestack()
         if stack > 1:
-            log('buff', self.name, f'{self.mod_type}({self.mod_order}): {value:.02f}', f'buff stack <{stack}>')
+            if log_enabled():
+                log('buff', self.name, f'{self.mod_type}({self.mod_order}): {value:.02f}', f'buff stack <{stack}>')
 
         if self.mod_type == 'defense':
             db = Event('defchain')
@@ -394,8 +612,12 @@ class Buff(object):
     def off(self):
         if self.__active == 0:
             return
-        self.logwrapper(self.name, f'{self.mod_type}({self.mod_order}): {self.value():.02f}', f'buff end <turn off>')
+        if log_enabled():
+            self.logwrapper(self.name, f'{self.mod_type}({self.mod_order}): {self.value():.02f}', f'buff end <turn off>')
         self.__active = 0
+        self.changed()
+        if 'get' not in self.__dict__:
+            self._static.buff_index.off(self)
         self.effect_off()
         self.buff_end_timer.off()
         return self
@@ -579,13 +801,15 @@ class SingleActionBuff(Buff):
         if self.get() and (e.name.startswith(self.mod_type) or (e.name == 'ds' and self.mod_type == 's')) \
            and self.uses > 0 and not e.name in self.active and e.name in self._static.adv.damage_sources:
             self.active.add(e.name)
-            self.logwrapper(self.name, e.name, str(self.active), 'act_on')
+            if log_enabled():
+                self.logwrapper(self.name, e.name, str(self.active), 'act_on')
             self.uses -= 1
 
     def act_off(self, e):
         if e.name in self.active:
             self.active.discard(e.name)
-            self.logwrapper(self.name, e.name, str(self.active), 'act_off')
+            if log_enabled():
+                self.logwrapper(self.name, e.name, str(self.active), 'act_off')
             if self.uses == 0:
                 self.off()
 
@@ -645,7 +869,8 @@ class ZoneTeambuff(Teambuff):
 
     @property
     def zone_buffs(self):
-        return sorted((b for b in self._static.all_buffs if type(b) == ZoneTeambuff and b.get()), key=lambda b: b.timeleft())
+        zones = self._static.buff_index.ordered(self._static.buff_index.by_bufftype('team', 'self'))
+        return sorted((b for b in zones if type(b) == ZoneTeambuff and b.get()), key=lambda b: b.timeleft())
 
     def on(self, duration=0):
         zones = self.zone_buffs
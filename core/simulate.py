@@ -3,11 +3,15 @@ import os
 import re
 import time
 import json
+import atexit
+from math import sqrt, inf
 from itertools import chain
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 from conf import ROOT_DIR, get_icon, get_fullname, load_equip_json, save_equip_json
 import core.acl
 import core.advbase
+import core.timeline
+from core.log import Log
 
 BR = 64
 def skill_efficiency(real_d, team_dps, mod):
@@ -29,17 +33,57 @@ DOT_AFFLICT = ['poison', 'paralysis', 'burn', 'frostbite']
 
 S_ALT = '†'
 
-def run_once(name, module, conf, duration, cond, equip_key=None):
-    adv = module(name=name, conf=conf, duration=duration, cond=cond, equip_key=equip_key)
+def run_once(name, module, conf, duration, cond, equip_key=None, profiler=None, log_sink=Log.FULL, acl_coverage=False):
+    adv = module(name=name, conf=conf, duration=duration, cond=cond, equip_key=equip_key, log_sink=log_sink)
+    adv.ctx.timeline.profiler = profiler
+    adv.acl_coverage = acl_coverage
+    if profiler is not None:
+        core.timeline.set_event_counting()
     real_d = adv.run()
+    if profiler is not None:
+        profiler.count('think evals', adv.think_evals)
+        profiler.count('think skipped', adv.think_skipped)
+        profiler.count('think merged', adv.think_merged)
+        profiler.count_fires(core.timeline.get_event_counts())
     return adv, real_d
 
-# Using starmap
 import multiprocessing
+# what a mass worker sends back, only the parts of Log that sum_logs reads
+MassResult = namedtuple('MassResult', ('idx', 'damage', 'team_buff', 'team_tension', 'real_d'))
 def run_once_mass(name, module, conf, duration, cond, equip_key, idx):
-    adv = module(name=name, conf=conf, duration=duration, cond=cond)
+    adv = module(name=name, conf=conf, duration=duration, cond=cond, stream=idx, log_sink=Log.SUMMARY)
     real_d = adv.run()
-    return adv.logs, real_d
+    logs = adv.logs
+    return MassResult(
+        idx,
+        {k: dict(v) for k, v in logs.damage.items()},
+        logs.team_buff,
+        dict(logs.team_tension),
+        real_d
+    )
+
+def _run_once_mass(args):
+    return run_once_mass(*args)
+
+_mass_pool = None
+def mass_pool():
+    # one pool per process, shared by every run_mass call
+    global _mass_pool
+    if _mass_pool is None:
+        _mass_pool = multiprocessing.Pool(
+            processes=multiprocessing.cpu_count(),
+            initializer=core.acl.set_disk_cache,
+            initargs=(core.acl.DISK_CACHE_DIR or core.acl.ACL_CACHE_DIR,)
+        )
+        atexit.register(close_mass_pool)
+    return _mass_pool
+
+def close_mass_pool():
+    global _mass_pool
+    if _mass_pool is not None:
+        _mass_pool.close()
+        _mass_pool.join()
+        _mass_pool = None
 
 def sum_logs(log, other):
     for k1 in log.damage:
@@ -65,17 +109,82 @@ def avg_logs(log, mass):
         log.team_tension[k] /= mass
     return log
 
-def run_mass(mass, base_log, base_d, name, module, conf, duration, cond, equip_key=None):
+Z_95 = 1.959964
+class MassStats(object):
+    """
+    Running mean and variance (Welford) of per run dps and team buff,
+    and the width of their 95% confidence intervals
+    """
+    def __init__(self):
+        self.n = 0
+        self.dps = 0
+        self.dps_m2 = 0
+        self.team = 0
+        self.team_m2 = 0
+
+    def add(self, log, real_d):
+        self.n += 1
+        dps = sum(map(dict_sum, log.damage.values())) / real_d
+        delta = dps - self.dps
+        self.dps += delta / self.n
+        self.dps_m2 += delta * (dps - self.dps)
+        team = log.team_buff / real_d
+        delta = team - self.team
+        self.team += delta / self.n
+        self.team_m2 += delta * (team - self.team)
+
+    def ci_width(self, m2):
+        if self.n < 2:
+            return inf
+        return 2 * Z_95 * sqrt(m2 / (self.n - 1) / self.n)
+
+    @property
+    def dps_ci(self):
+        return self.ci_width(self.dps_m2)
+
+    @property
+    def team_ci(self):
+        return self.ci_width(self.team_m2)
+
+    def converged(self, ci=None, ci_team=None):
+        if ci is None and ci_team is None:
+            return False
+        return (ci is None or self.dps_ci <= ci) and (ci_team is None or self.team_ci <= ci_team)
+
+def run_mass(mass, base_log, base_d, name, module, conf, duration, cond, equip_key=None, ci=None, ci_team=None):
+    # mass is the run count, or the cap on it when a target ci width on dps/team buff is given
     mass = 1000 if mass == 1 else mass
-    with multiprocessing.Pool(processes=multiprocessing.cpu_count()) as pool:
-        for log, real_d in pool.starmap(run_once_mass, [(name, module, conf, duration, cond, equip_key, idx) for idx in range(mass-1)]):
-            base_log = sum_logs(base_log, log)
-            base_d += real_d
-    base_log = avg_logs(base_log, mass)
-    base_d /= mass
-    return base_log, base_d
-
-def test(name, module, conf={}, duration=180, verbose=0, mass=None, output=None, cond=True, special=False):
+    stats = MassStats()
+    stats.add(base_log, base_d)
+    if ci is None and ci_team is None:
+        batch = mass - 1
+    else:
+        # start small so converged advs stop early, then double each round
+        batch = multiprocessing.cpu_count() * 2
+    pool = mass_pool()
+    idx = 0
+    while stats.n < mass:
+        size = min(batch, mass - stats.n)
+        tasks = ((name, module, conf, duration, cond, equip_key, i) for i in range(idx, idx+size))
+        chunksize = max(1, size // (multiprocessing.cpu_count() * 4))
+        # sum in idx order so the result does not depend on worker timing
+        pending = {}
+        for res in pool.imap_unordered(_run_once_mass, tasks, chunksize):
+            pending[res.idx] = res
+            while idx in pending:
+                res = pending.pop(idx)
+                base_log = sum_logs(base_log, res)
+                base_d += res.real_d
+                stats.add(res, res.real_d)
+                idx += 1
+        if stats.converged(ci, ci_team):
+            break
+        batch *= 2
+    base_log = avg_logs(base_log, stats.n)
+    base_d /= stats.n
+    return base_log, base_d, stats
+
+def test(name, module, conf={}, duration=180, verbose=0, mass=None, output=None, cond=True, special=False, profiler=None, ci=None, ci_team=None, log_sink=Log.FULL, acl_coverage=False):
     output = output or sys.stdout
     if verbose == 2:
         # output.write(adv._acl_str)
@@ -84,7 +193,14 @@ def test(name, module, conf={}, duration=180, verbose=0, mass=None, output=None,
         output.write(str(core.acl.build_acl(adv.conf.acl)._tree.pretty()))
         return
     run_results = []
-    adv, real_d = run_once(name, module, conf, duration, cond, equip_key=None)
+    if verbose in (1, 255):
+        log_sink = Log.FULL
+    if verbose == 3:
+        acl_coverage = True
+    adv, real_d = run_once(name, module, conf, duration, cond, equip_key=None, profiler=profiler, log_sink=log_sink, acl_coverage=acl_coverage)
+    if verbose == 3:
+        acl_sum(adv._acl.coverage(), output)
+        return
     if verbose == 255:
         output.write(str(adv.slots))
         output.write('\n')
@@ -94,10 +210,13 @@ def test(name, module, conf={}, duration=180, verbose=0, mass=None, output=None,
     if verbose == 1:
         adv.logs.write_logs(output=output)
         act_sum(adv.logs.act_seq, output)
+        if acl_coverage:
+            output.write('\n\n')
+            acl_sum(adv._acl.coverage(), output)
         return
 
     if mass:
-        adv.logs, real_d = run_mass(mass, adv.logs, real_d, name, module, conf, duration, cond)
+        adv.logs, real_d, adv.mass_stats = run_mass(mass, adv.logs, real_d, name, module, conf, duration, cond, ci=ci, ci_team=ci_team)
     run_results.append((adv, real_d, True))
 
     aff_name = ELE_AFFLICT[adv.slots.c.ele]
@@ -109,9 +228,9 @@ def test(name, module, conf={}, duration=180, verbose=0, mass=None, output=None,
             for aff_name in DOT_AFFLICT[:(-verbose-6)]:
                 conf[f'sim_afflict.{aff_name}'] = 1
         equip_key = 'affliction' if adv.equip_key != 'buffer' else 'buffer'
-        adv, real_d = run_once(name, module, conf, duration, cond, equip_key=equip_key)
+        adv, real_d = run_once(name, module, conf, duration, cond, equip_key=equip_key, profiler=profiler, log_sink=log_sink)
         if mass:
-            adv.logs, real_d = run_mass(mass, adv.logs, real_d, name, module, conf, duration, cond, equip_key=equip_key)
+            adv.logs, real_d, adv.mass_stats = run_mass(mass, adv.logs, real_d, name, module, conf, duration, cond, equip_key=equip_key, ci=ci, ci_team=ci_team)
         run_results.append((adv, real_d, 'affliction'))
 
     for a, d, c in run_results:
@@ -170,27 +289,51 @@ def append_condensed(condensed, act):
     condensed.append((act, 1))
     return condensed
 
+def z_prefix(seq, start, limit):
+    # z[i] is the length of the common prefix of seq[start:] and seq[start+i:], for i < limit
+    n = len(seq) - start
+    z = [0] * limit
+    if limit:
+        z[0] = n
+    l = r = 0
+    for i in range(1, limit):
+        if i < r:
+            z[i] = min(r - i, z[i - l])
+        while i + z[i] < n and seq[start + z[i]] == seq[start + i + z[i]]:
+            z[i] += 1
+        if i + z[i] > r:
+            l, r = i, i + z[i]
+    return z
+
 def act_repeats(condensed):
-    from collections import Counter
-    condensed = list(filter(lambda a: a[0] != 'dshift', condensed))
-    start = 0
-    maxlen = len(condensed)
+    """
+    Find the most repeated rotation: the first start with the highest count of back to back
+    copies of one of its prefixes, and the shortest such prefix
+    A prefix of length n_len repeats 1 + z[n_len]//n_len times, starts stop at the first length
+    that repeats up to the end, and lengths that can no longer fit more copies are skipped
+    """
+    condensed = [a for a in condensed if a[0] != 'dshift']
+    ids = {}
+    seq = [ids.setdefault(a, len(ids)) for a in condensed]
+    maxlen = len(seq)
     bestest = condensed, 1, 0
     for start in range(0, maxlen):
-        accumulator = Counter()
-        length = 1
-        c_slice = tuple(condensed[start:start+length])
-        while start+length*(accumulator[c_slice]+1) <= maxlen:
-            n_slice = tuple(condensed[start+length*accumulator[c_slice]:start+length*(accumulator[c_slice]+1)])
-            if n_slice == c_slice:
-                accumulator[c_slice] += 1
-            else:
-                length += 1
-                c_slice = tuple(condensed[start:start+length])
-                accumulator[c_slice] = 1
-        c_best = accumulator.most_common(1)
-        if len(c_best) > 0 and c_best[0][1] > bestest[1]:
-            bestest = (*c_best[0], start)
+        rest = maxlen - start
+        if rest <= bestest[1]:
+            break
+        z = z_prefix(seq, start, rest // (bestest[1] + 1) + 1)
+        freq, length = 0, 0
+        for n_len in range(1, len(z)):
+            fits = rest // n_len
+            if fits <= bestest[1] or fits <= freq:
+                break
+            n_freq = 1 + z[n_len] // n_len
+            if n_freq > freq:
+                freq, length = min(n_freq, fits), n_len
+            if n_freq >= fits:
+                break
+        if freq > bestest[1]:
+            bestest = tuple(condensed[start:start+length]), freq, start
     return bestest
 
 def act_sum(actions, output):
@@ -259,6 +402,13 @@ def act_sum(actions, output):
         if cnt > 1:
             output.write('*{}'.format(cnt))
 
+def acl_sum(coverage, output):
+    output.write(f'{"acl":<44}{"evals":>8}{"true":>8}{"taken":>8}{"cum ms":>10}\n')
+    for stat in coverage:
+        # lines that never acted are the ones to prune
+        mark = ' ' if stat['taken'] else '!'
+        output.write(f'{mark}{stat["line"]:>3} {stat["statement"][:39]:<40}{stat["evals"]:>8}{stat["true"]:>8}{stat["taken"]:>8}{stat["time"]*1000:>10.2f}\n')
+
 def dps_sum(real_d, damage):
     res = {'dps':0}
     for k, v in damage.items():
@@ -356,6 +506,11 @@ def compile_stats(real_d, adv, do_buffs=True):
     stat_str = adv.stats or []
     for aff, up in adv.afflics.get_uptimes().items():
         stat_str.append(f'{aff}:{up:.1%}')
+    for aff, p in adv.afflics.get_pruned().items():
+        stat_str.append(f'{aff} pruned:{p:.2g}')
+    mass_stats = getattr(adv, 'mass_stats', None)
+    if mass_stats is not None:
+        stat_str.append(f'mass:{mass_stats.n} runs ±{mass_stats.dps_ci/2:.0f}')
     if not do_buffs:
         return ';'.join(stat_str)
     if adv.logs.team_buff > 0:
@@ -600,6 +755,16 @@ def load_adv_module(name, in_place=None):
         return core.advbase.Adv, name
 
 def test_with_argv(*argv):
+    # --profile prints a timeline profile table, --profile=<file> also dumps it as json
+    # --coverage adds the acl coverage table to verbose 1 output
+    profiler = None
+    profile_json = None
+    acl_coverage = '--coverage' in argv
+    for arg in argv:
+        if isinstance(arg, str) and arg.startswith('--profile'):
+            profiler = core.timeline.TimelineProfiler()
+            _, _, profile_json = arg.partition('=')
+    argv = [arg for arg in argv if not (isinstance(arg, str) and (arg.startswith('--profile') or arg == '--coverage'))]
     if argv[0] is not None and not isinstance(argv[0], str):
         module = argv[0]
     else:
@@ -616,7 +781,17 @@ def test_with_argv(*argv):
         mass = int(argv[4])
     except:
         mass = 0
-    test(name, module, verbose=verbose, duration=duration, mass=mass)
+    try:
+        ci = float(argv[5])
+    except:
+        ci = None
+    test(name, module, verbose=verbose, duration=duration, mass=mass, profiler=profiler, ci=ci, acl_coverage=acl_coverage)
+    if profiler is not None:
+        profiler.report(sys.stdout)
+        print('acl cache:', ', '.join(f'{k} {v}' for k, v in core.acl.acl_cache_info().items()))
+        if profile_json:
+            with open(profile_json, 'w') as f:
+                f.write(profiler.to_json(indent=2))
 
 if __name__ == '__main__':
     test_with_argv(*sys.argv)
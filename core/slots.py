@@ -233,7 +233,7 @@ class DragonBase(EquipBase):
 
 from core.modifier import EffectBuff, SingleActionBuff
 from core.timeline import Timer, now
-from core.log import log
+from core.log import log, log_enabled
 ### FLAME DRAGONS ###
 class Gala_Mars(DragonBase):
     def oninit(self, adv):
@@ -354,7 +354,8 @@ class Gala_Cat_Sith(DragonBase):
         self.trickery_buff = SingleActionBuff('d_trickery_buff', 1.80, 1, 's', 'buff').on()
         def add_trickery(t):
             adv.trickery = min(adv.trickery+t, Gala_Cat_Sith.MAX_TRICKERY)
-            log('debug', 'trickery', f'+{t}', adv.trickery, adv.hits)
+            if log_enabled():
+                log('debug', 'trickery', f'+{t}', adv.trickery, adv.hits)
         def check_trickery(e=None):
             if adv.trickery > 0 and not self.trickery_buff.get():
                 adv.trickery -= 1
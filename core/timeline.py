@@ -1,41 +1,115 @@
 import heapq as hq
 import itertools
+import json
+from time import perf_counter
 from core.ctx import *
-import core.log
 
 def now():
-    return _g_now
+    return SimContext.active.now
 
 
 def set_time(time):
-    global _g_now
-    _g_now = time
+    SimContext.active.now = time
 
 utp = 0
 NOW = 1
 AFTER = 2
-def add_event_listener(eventname, listener, order=1): #listener should be a function
-    global _g_event_listeners
+class Dispatch(tuple):
+    """
+    Flattened listeners of an event, remembers how many came from each order
+    """
+    def __new__(cls, orders, counter=None):
+        listeners = itertools.chain.from_iterable(orders)
+        self = super().__new__(cls, itertools.chain((counter,), listeners) if counter else listeners)
+        self.spans = tuple(map(len, orders))
+        self.offset = 1 if counter else 0
+        return self
 
-    if not eventname in _g_event_listeners:
-        _g_event_listeners[eventname] = [[], [], []]
-    _g_event_listeners[eventname][order].append(listener)
+
+class EventTrigger(object):
+    """
+    Listeners of one event name, in 3 orders, plus the flattened dispatch
+    tuple that Event.on walks. The tuple is only rebuilt when listeners change.
+    """
+    __slots__ = ('name', 'orders', 'dispatch', 'fired', 'counting')
+
+    def __init__(self, name, counting=False):
+        self.name = name
+        self.orders = ([], [], [])
+        self.fired = 0
+        self.counting = counting
+        self.rebuild()
+
+    def rebuild(self):
+        # counter rides along as a listener, so disabled counting costs nothing
+        self.dispatch = Dispatch(self.orders, self.count if self.counting else None)
+
+    def count(self, e):
+        self.fired += 1
+
+    def set_counting(self, enabled):
+        self.counting = enabled
+        self.rebuild()
+
+    def resume(self, e, dispatch, pos):
+        # listeners changed during dispatch, continue on the live lists
+        # from dispatch[pos], same as iterating the order lists directly
+        idx = pos - dispatch.offset
+        for order, span in enumerate(dispatch.spans):
+            if idx < span:
+                break
+            idx -= span
+        live = self.orders[order]
+        idx += 1
+        while idx < len(live):
+            live[idx](e)
+            idx += 1
+        for orders in self.orders[order+1:]:
+            for cb in orders:
+                cb(e)
+
+
+def add_event_listener(eventname, listener, order=1): #listener should be a function
+    trigger = get_event_trigger(eventname)
+    trigger.orders[order].append(listener)
+    trigger.rebuild()
 
 
 def remove_event_listener(eventname, listener):
-    if not eventname in _g_event_listeners:
+    event_listeners = SimContext.active.event_listeners
+    if not eventname in event_listeners:
         return
-    for orders in _g_event_listeners[eventname]:
+    trigger = event_listeners[eventname]
+    for orders in trigger.orders:
         try:
             orders.remove(listener)
         except ValueError:
             continue
+    trigger.rebuild()
 
 def get_event_trigger(eventname, trigger = []): 
-    global _g_event_listeners
-    if eventname not in _g_event_listeners:
-        _g_event_listeners[eventname] = [[], [], []]
-    return _g_event_listeners[eventname]
+    event_listeners = SimContext.active.event_listeners
+    try:
+        return event_listeners[eventname]
+    except KeyError:
+        trigger = EventTrigger(eventname, counting=SimContext.active.count_events)
+        event_listeners[eventname] = trigger
+        return trigger
+
+
+def set_event_counting(enabled=True):
+    ctx = SimContext.active
+    ctx.count_events = enabled
+    for trigger in ctx.event_listeners.values():
+        trigger.set_counting(enabled)
+
+
+def get_event_counts():
+    counts = {name: trigger.fired for name, trigger in SimContext.active.event_listeners.items() if trigger.fired}
+    return dict(sorted(counts.items(), key=lambda c: c[1], reverse=True))
+
+
+NO_TRIGGER = EventTrigger(None)
 
 
 class Event(object):
@@ -45,7 +119,7 @@ class Event(object):
             self.__name = name
             self._trigger = get_event_trigger(name)
         else:
-            self._trigger = []
+            self._trigger = NO_TRIGGER
 
 
     def listener(self, cb, eventname=None, order=1):
@@ -60,9 +134,12 @@ class Event(object):
 
 
     def on(self, e=None):
-        for orders in self._trigger:
-            for cb in orders:
-                cb(self)
+        trigger = self._trigger
+        dispatch = trigger.dispatch
+        for pos, cb in enumerate(dispatch):
+            cb(self)
+            if trigger.dispatch is not dispatch:
+                return trigger.resume(self, dispatch, pos)
 
     def __call__(self, expand=None):
         self.on(self)
@@ -119,11 +196,14 @@ class Listener(object):
 
 
 class Timer(object):
+    __slots__ = ('process', 'timeout', 'callback', 'timeline', 'ctx', 'began', 'timing', 'online', 'canceled', '__dict__')
+
     def __init__(self, proc=None, timeout=None, repeat=0, timeline=None):
         self.process = proc or self._process
         self.timeout = timeout or 0
         self.callback = self.callback_repeat if repeat else self.callback_once
-        self.timeline = timeline or _g_timeline
+        self.timeline = timeline or SimContext.active.timeline
+        self.ctx = self.timeline.ctx
 
         self.began = None
         self.timing = 0
@@ -135,19 +215,19 @@ class Timer(object):
         if not self.began:
             return 0
         else:
-            return _g_now - self.began
+            return self.ctx.now - self.began
 
     def on(self, timeout = None):
         if timeout:
             self.timeout = timeout
-            self.timing = _g_now + timeout
+            self.timing = self.ctx.now + timeout
         else:
-            self.timing = _g_now + self.timeout
+            self.timing = self.ctx.now + self.timeout
         self.canceled = False
         if self.online == 0:
             self.online = 1
         self.timeline.add(self)
-        self.began = _g_now
+        self.began = self.ctx.now
         return self
 
     def off(self):
@@ -166,11 +246,11 @@ class Timer(object):
         # core.log.log('timeline', self.timing, self.timing+time, time, self.timing+time-now())
         self.timeout += time
         self.timing += time
-        if self.timing < now():
+        if self.timing < self.ctx.now:
             self.off()
         elif self.online:
             self.timeline.add(self)
-        return self.timing - now()
+        return self.timing - self.ctx.now
 
     #alias
     disable = off
@@ -183,20 +263,17 @@ class Timer(object):
 
     def callback_repeat(self):
         self.process(self)
-        if self.timing == _g_now:
+        if self.timing == self.ctx.now:
             self.timing += self.timeout
             self.timeline.add(self)
 
     def callback_once(self):
         self.process(self)
-        if self.timing <= _g_now:
+        if self.timing <= self.ctx.now:
             if self.online:
                 self.online = 0
                 # self.timeline.rm(self)
 
-    def callback(self):
-        pass
-
     def __repr__(self):
         # return '%f: Timer:%s'%(self.timing,self.process)
         # return f'{self.timing}: {self.process}'
@@ -208,12 +285,151 @@ class Timer(object):
         return 1
 
 
+class PooledTimer(Timer):
+    """
+    One shot timer whose payload lives in slots. Instances go back to a per class
+    free list once they fire or get cleared by their owner (Action.clear_delayed),
+    so hot paths that schedule thousands of hits don't allocate a timer each.
+    Anything that holds on to the timer after that must call keep().
+    A timer cleared from inside its own callback goes back once the callback returns.
+    """
+    __slots__ = ('owner', 'kept', 'firing')
+    pool = []
+    created = 0
+    reused = 0
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.pool = []
+        cls.created = 0
+        cls.reused = 0
+
+    @classmethod
+    def get(cls, proc):
+        try:
+            t = cls.pool.pop()
+        except IndexError:
+            cls.created += 1
+            t = cls(proc)
+            t.owner = None
+            t.kept = False
+            t.firing = False
+            return t
+        cls.reused += 1
+        t.process = proc
+        t.timeline = SimContext.active.timeline
+        t.ctx = t.timeline.ctx
+        return t
+
+    @classmethod
+    def stats(cls):
+        return {'created': cls.created, 'reused': cls.reused, 'free': len(cls.pool)}
+
+    def keep(self):
+        self.kept = True
+        return self
+
+    def release(self):
+        if self.kept or self.online or self.firing:
+            return
+        for k in self.__slots__:
+            try:
+                delattr(self, k)
+            except AttributeError:
+                pass
+        self.owner = None
+        self.timeout = 0
+        self.began = None
+        self.timing = 0
+        self.canceled = False
+        self.__class__.pool.append(self)
+
+    def callback_once(self):
+        self.firing = True
+        self.process(self)
+        self.firing = False
+        if self.timing <= self.ctx.now:
+            self.online = 0
+            if self.owner is not None:
+                self.owner.delayed.discard(self)
+            self.release()
+
+
+class TickScheduler(object):
+    """
+    Periodic ticks (dots, bleed) grouped by the time of their next tick, so every
+    distinct tick time is a single timeline entry however many procs share it.
+    Procs in a group fire back to back in the order they were scheduled. Unlike
+    separate timers, another timer pushed for the same time between two procs of
+    a group runs after the whole group, tick handlers must not rely on running
+    around it. A proc has to schedule itself again for its next tick.
+    """
+    def __init__(self, ctx=None):
+        self.ctx = ctx or SimContext.active
+        # timing -> (timer, {proc: None})
+        self.groups = {}
+        # proc -> timing
+        self.pending = {}
+
+    def schedule(self, proc, delay):
+        self.cancel(proc)
+        timing = self.ctx.now + delay
+        try:
+            group = self.groups[timing][1]
+        except KeyError:
+            group = {}
+            timer = Timer(self.fire, timeline=self.ctx.timeline).on(delay)
+            self.groups[timing] = (timer, group)
+        group[proc] = None
+        self.pending[proc] = timing
+
+    def cancel(self, proc):
+        try:
+            timing = self.pending.pop(proc)
+        except KeyError:
+            return
+        timer, group = self.groups[timing]
+        del group[proc]
+        if not group:
+            timer.off()
+            del self.groups[timing]
+
+    def fire(self, t):
+        # the group stays registered while it fires, so procs in it can still be canceled
+        timeline = self.ctx.timeline
+        _, group = self.groups[t.timing]
+        while group:
+            proc = next(iter(group))
+            del group[proc]
+            del self.pending[proc]
+            proc()
+            if timeline.over():
+                # the run stops here, the rest would not have been reached either
+                return
+        self.groups.pop(t.timing, None)
+
+
 class Timeline(object):
     REMOVED = '<REMOVED>'
-    def __init__(self):
+    # rebuild the heap once this fraction of its entries are tombstones
+    COMPACT_RATIO = 0.5
+    COMPACT_MIN = 64
+    def __init__(self, ctx=None, compact_ratio=None):
+        self.ctx = ctx or SimContext.active
         self._tlist = []
         self._tmap = {}
         self._tseq = itertools.count()
+        self._dead = 0
+        self.compact_ratio = Timeline.COMPACT_RATIO if compact_ratio is None else compact_ratio
+        # counters
+        self.pushes = 0
+        self.pops = 0
+        self.skipped = 0
+        self.compactions = 0
+        self.peak = 0
+        # attach a TimelineProfiler to time callbacks, see _run
+        self.profiler = None
+        self.end = float('inf')
 
     def add(self, t):
         # self._tlist.append(t)
@@ -223,32 +439,47 @@ class Timeline(object):
         entry = [t.timing, count, t]
         self._tmap[t] = entry
         hq.heappush(self._tlist, entry)
+        self.pushes += 1
+        if len(self._tlist) > self.peak:
+            self.peak = len(self._tlist)
 
     def rm(self, t):
         # i = self._tlist.index(t)
         # return self._tlist.pop(i)
         entry = self._tmap.pop(t)
         entry[-1] = Timeline.REMOVED
+        self._dead += 1
+        if self._dead > Timeline.COMPACT_MIN and self._dead > len(self._tlist) * self.compact_ratio:
+            self.compact()
+
+    def compact(self):
+        # entries are unique by (timing, count), so heapify keeps the pop order
+        self._tlist = [entry for entry in self._tlist if entry[-1] is not Timeline.REMOVED]
+        hq.heapify(self._tlist)
+        self._dead = 0
+        self.compactions += 1
 
     def pop(self):
-        from pprint import pprint
         while self._tlist:
             timing, _, t = hq.heappop(self._tlist)
             if t is not Timeline.REMOVED:
                 del self._tmap[t]
+                self.pops += 1
                 return t
+            self._dead -= 1
+            self.skipped += 1
         # raise RuntimeError('Timeline error', self._tlist)
 
     def process_head(self):
-        global _g_now
+        ctx = self.ctx
         tnext = self.pop()
         if not tnext:
             return -1
-        if tnext.timing >= _g_now:
-            _g_now = tnext.timing
+        if tnext.timing >= ctx.now:
+            ctx.now = tnext.timing
             tnext.callback()
         else:
-            raise RuntimeError(f'Timeline error {tnext.timing:.03f} < {_g_now:.03f} - {tnext}')
+            raise RuntimeError(f'Timeline error {tnext.timing:.03f} < {ctx.now:.03f} - {tnext}')
         return 0
         # tcount = len(self._tlist)
         # if tcount == 0:
@@ -276,32 +507,63 @@ class Timeline(object):
     
     @classmethod
     def run(cls, last = 100):
-        global _g_timeline
-        return _g_timeline._run(last)
+        return SimContext.active.timeline._run(last)
 
     @classmethod
     def stop(cls, last = 100):
-        global _g_timeline
-        return _g_timeline._stop()
+        return SimContext.active.timeline._stop()
 
     def _stop(self):
-        global _g_stop
-        _g_stop = 1
+        self.ctx.stop = 1
+
 
+    def process_head_profiled(self):
+        ctx = self.ctx
+        tnext = self.pop()
+        if not tnext:
+            return -1
+        if tnext.timing >= ctx.now:
+            ctx.now = tnext.timing
+            self.profiler.timer(tnext)
+        else:
+            raise RuntimeError(f'Timeline error {tnext.timing:.03f} < {ctx.now:.03f} - {tnext}')
+        return 0
 
     def _run(self, last = 100):
-        last += _g_now
+        ctx = self.ctx.on()
+        self.end = ctx.now + last
+        if self.profiler is None:
+            return self._loop(ctx, self.end, self.process_head)
+        with self.profiler:
+            return self._loop(ctx, self.end, self.process_head_profiled)
+
+    def over(self):
+        # whether _loop stops before the next timer
+        return self.ctx.now > self.end or self.ctx.stop
+
+    def _loop(self, ctx, last, process_head):
         while 1:
-            if _g_now > last:
-                return _g_now, 'timeout'
+            if ctx.now > last:
+                return ctx.now, 'timeout'
 
-            r = self.process_head()
+            r = process_head()
             if r == -1:
-                return _g_now, 'empty'
+                return ctx.now, 'empty'
             
-            if _g_stop:
-                return _g_now, 'forced'
+            if ctx.stop:
+                return ctx.now, 'forced'
+
 
+    def stats(self):
+        return {
+            'pushes': self.pushes,
+            'pops': self.pops,
+            'tombstones_skipped': self.skipped,
+            'compactions': self.compactions,
+            'peak_size': self.peak,
+            'size': len(self._tlist),
+            'live': len(self._tlist) - self._dead,
+        }
 
     def __str__(self):
         return 'Timeline tlist: %s'%(str(self._tlist))
@@ -309,13 +571,113 @@ class Timeline(object):
 #} class Timeline
 
 
-Ctx().on()
-Ctx.register(globals(),{
-    '_g_now'             : 0 ,
-    '_g_stop'            : 0 ,
-    '_g_timeline'        : Timeline() ,
-    '_g_event_listeners' : {} ,
-    })
+class TimelineProfiler(object):
+    """
+    Call count and cumulative wall time per timer callback and per event name.
+    Attach to Timeline.profiler; while the timeline runs Event.on is swapped for
+    a timed version, so an unprofiled run pays nothing.
+    Times are inclusive: a timer that fires events also counts their time,
+    recursive calls of the same key are only timed at the outermost level.
+    Runs given a profiler also turn on event counting, see count_fires.
+    """
+    def __init__(self):
+        self.timers = {}
+        self.events = {}
+        self.counters = {}
+        self.fires = {}
+        self.elapsed = 0
+        self.runs = 0
+
+    def __enter__(self):
+        event_on = Event.on
+        events = self.events
+        measure = self.measure
+        def on(e, _=None):
+            return measure(events, e._trigger.name, event_on, e)
+        self._event_on = event_on
+        Event.on = on
+        self._began = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed += perf_counter() - self._began
+        self.runs += 1
+        Event.on = self._event_on
+        return False
+
+    @staticmethod
+    def measure(table, key, fn, *args):
+        try:
+            stat = table[key]
+        except KeyError:
+            stat = table[key] = [0, 0.0, 0]
+        stat[0] += 1
+        if stat[2]:
+            stat[2] += 1
+            try:
+                return fn(*args)
+            finally:
+                stat[2] -= 1
+        stat[2] = 1
+        began = perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            stat[1] += perf_counter() - began
+            stat[2] = 0
+
+    def count(self, key, n=1):
+        self.counters[key] = self.counters.get(key, 0) + n
+
+    def count_fires(self, counts):
+        # per event fire counts of a run, from get_event_counts
+        for name, n in counts.items():
+            self.fires[name] = self.fires.get(name, 0) + n
+
+    def timer(self, t):
+        proc = t.process
+        name = getattr(proc, '__qualname__', None) or type(proc).__qualname__
+        return self.measure(self.timers, name, t.callback)
+
+    @staticmethod
+    def _sorted(table):
+        return sorted(((k, s[0], s[1]) for k, s in table.items()), key=lambda s: s[2], reverse=True)
+
+    def to_dict(self):
+        return {
+            'runs': self.runs,
+            'elapsed': self.elapsed,
+            'timers': [{'name': k, 'calls': c, 'cumtime': t} for k, c, t in self._sorted(self.timers)],
+            'events': [{'name': k, 'calls': c, 'cumtime': t} for k, c, t in self._sorted(self.events)],
+            'counters': dict(self.counters),
+            'fires': dict(sorted(self.fires.items(), key=lambda c: c[1], reverse=True)),
+        }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def report(self, output, limit=None):
+        elapsed = self.elapsed or 1
+        output.write(f'timeline profile: {self.runs} run(s), {self.elapsed*1000:.1f}ms\n')
+        for title, table in (('timer callback', self.timers), ('event', self.events)):
+            rows = self._sorted(table)
+            output.write(f'{title:<48}{"calls":>10}{"cum ms":>12}{"us/call":>10}{"%":>8}\n')
+            for name, calls, cumtime in rows[:limit]:
+                output.write(f'{str(name)[:47]:<48}{calls:>10}{cumtime*1000:>12.2f}{cumtime*1e6/calls:>10.2f}{cumtime*100/elapsed:>8.1f}\n')
+            output.write('\n')
+        if self.fires:
+            output.write(f'{"event fires":<48}{"count":>10}\n')
+            for name, n in sorted(self.fires.items(), key=lambda c: c[1], reverse=True)[:limit]:
+                output.write(f'{str(name)[:47]:<48}{n:>10}\n')
+            output.write('\n')
+        if self.counters:
+            output.write(', '.join(f'{k} {v}' for k, v in self.counters.items()))
+            output.write('\n\n')
+
+#} class TimelineProfiler
+
+
+SimContext().on()
 
 
 
@@ -351,7 +713,7 @@ def main():
     e2 = Timer(a2,2).on()
     e3 = Timer(a.a3,3).on()
 
-    _g_timeline.run()
+    Timeline.run()
 
 
 
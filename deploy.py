@@ -4,13 +4,17 @@ import hashlib
 import json
 from copy import deepcopy
 from time import monotonic, time_ns
+import core.acl
 import core.simulate
+from core.log import Log
 from conf import ROOT_DIR, load_equip_json, load_adv_json, list_advs
 
 ADV_DIR = 'adv'
 CHART_DIR = 'www/dl-sim'
 DURATIONS = (60, 120, 180)
 SKIP_VARIANT = ('RNG', 'mass')
+# stop mass sims once the 95% ci on dps is this narrow, 1000 runs at most
+MASS_CI = 100
 
 def sha256sum(filename):
     if not os.path.exists(filename):
@@ -52,8 +56,8 @@ def sim_adv(name, variants, sanity_test=False):
             for d in durations:
                 run_results = core.simulate.test(
                     name, adv_module, {},
-                    duration=d, verbose=verbose, mass=mass,
-                    special=v is not None, output=output
+                    duration=d, verbose=verbose, mass=mass, ci=MASS_CI,
+                    special=v is not None, output=output, log_sink=Log.SUMMARY
                 )
             output.close()
             if not sanity_test:
@@ -71,7 +75,7 @@ def run_and_save(name, module, ele, dkey, ekey, conf, repair=False):
         aff_name = core.simulate.ELE_AFFLICT[ele]
         conf[f'sim_afflict.{aff_name}'] = 1
     with open(os.devnull, 'w') as output:
-        run_res = core.simulate.test(name, module, conf, duration=int(dkey), verbose=0, output=output)
+        run_res = core.simulate.test(name, module, conf, duration=int(dkey), verbose=0, output=output, log_sink=Log.SUMMARY)
         core.simulate.save_equip(run_res[0][0], run_res[0][1], repair=repair, etype=ekey)
 
 
@@ -206,6 +210,7 @@ def main(arguments):
         arguments.remove('-rp')
         is_repair = True
 
+    core.acl.set_disk_cache(core.acl.ACL_CACHE_DIR)
     target_modules = get_sim_target_modules(arguments)
 
     message = []
@@ -242,5 +247,8 @@ if __name__ == '__main__':
         print('USAGE python {} sim_targets [-c] [-sp]'.format(sys.argv[0]))
         exit(1)
     t_start = monotonic()
-    main(sys.argv.copy()[1:])
+    try:
+        main(sys.argv.copy()[1:])
+    finally:
+        core.simulate.close_mass_pool()
     print('total: {:.4f}s'.format(monotonic() - t_start))
@@ -1,12 +1,12 @@
-from functools import partial
 from itertools import combinations
 
 from core.advbase import *
 
 class Bleed(Dot):
-    _static = {}
-    _static['all_bleeds'] = []
-    _static['stacks'] = 0
+    _static = Static({
+        'all_bleeds': [],
+        'stacks': 0
+    })
 
     def __init__(self, name, dmg_coef, duration=30, debufftime=1):
         Dot.__init__(self, name, dmg_coef, duration, 4.99)
@@ -18,6 +18,7 @@ class Bleed(Dot):
         self.true_dmg_event = Event('true_dmg')
         self.true_dmg_event.dname = f'o_{name}_bleed'
         self.true_dmg_event.dtype = name
+        self.true_dmg_event.comment = ''
         self.debufftime = debufftime
 
     def reset(self):
@@ -25,7 +26,7 @@ class Bleed(Dot):
         self._static['stacks'] = 0
         return self
 
-    def tick_proc(self, e):
+    def tick_proc(self):
         dmg_sum = 0
         stacks = self._static['stacks']
         for i in self._static['all_bleeds']:
@@ -33,22 +34,24 @@ class Bleed(Dot):
         if stacks < 0 or stacks > 3:
             raise Exception(f'Bleed stack out of range ({stacks}).')
         dmg = dmg_sum * (stacks + 1) * 0.5
-        self.true_dmg_event.comment = ' stack <%d>'%stacks
+        if log_enabled():
+            self.true_dmg_event.comment = ' stack <%d>'%stacks
         self.true_dmg_event.count = dmg
         self.true_dmg_event.on()
         #log('dmg','o_bleed',dmg,'%d stacks'%stacks)
-        e.add(self.iv)
+        self.ticks.schedule(self.tick_proc, self.iv)
 
     def dot_end_proc(self, e):
         idx = self._static['all_bleeds'].index(self)
         self._static['all_bleeds'].pop(idx)
         self._static['stacks'] -= 1
-        log('debuff','bleed','stack_end','stack <%d>'%self._static['stacks'])
+        if log_enabled():
+            log('debuff','bleed','stack_end','stack <%d>'%self._static['stacks'])
         if self._static['stacks'] < 0:
             print('err in bleed dot_end_proc')
             exit()
         if self._static['stacks'] == 0:
-            self._static['tick_event'].off()
+            self.ticks.cancel(self._static['tick_event'])
 
     def get(self):
         return self._static['stacks']
@@ -62,138 +65,115 @@ class Bleed(Dot):
             exit()
 
         duration = self.duration*self.debufftime
-        log('debuff','bleed', f'<{duration:.02f}>')
+        if log_enabled():
+            log('debuff','bleed', f'<{duration:.02f}>')
         self.quickshot_event()
         self._static['all_bleeds'].append(self)
         self.dot_end_timer.on(duration)
 
         if self._static['stacks'] == 0:
-            self._static['tick_event'] = Timer(self.tick_proc, self.iv, True).on()
+            self._static['tick_event'] = self.tick_proc
+            self.ticks.schedule(self.tick_proc, self.iv)
         elif self._static['stacks'] < 3:
             pass
         self._static['stacks'] += 1
 
 
 class mBleed(Bleed):
-    _static = {}
-    _static['all_bleeds'] = []
-    _static['stacks'] = 0
-    _static['cache'] = []
+    """
+    Bleed that procs with a chance, tracked as a distribution over which stacks
+    are active: states maps the active bleeds (in order applied, at most 3) to
+    the probability of having exactly those up. Applying a bleed splits every
+    state with room into proc and whiff, an expiry drops the bleed from every
+    state, so a tick only has to go over the distinct states.
+    """
+    _static = Static({
+        'stacks': 0,
+        'states': {(): 1.0}
+    })
 
     def __init__(self, name, dmg_coef, chance=0.8, debufftime=1):
         super(mBleed, self).__init__(name, dmg_coef, debufftime=debufftime)
-        self.end_index = None
         self.chance = chance
 
-    def sum_bleeds(self, bleeds, active=None, probability=1.0, index=0):
-        ''' Calculates the total damage from bleed during the current tick
-        Keeps a running probability of each possible combination of active bleed stacks in cache
-        Also able to calculate it from scratch which is slower
-
-        Parameters
-        ----------
-        bleeds : list
-            The list of all current and past bleed instances
-        active : list, optional
-            The list of currently active bleed instances
-        probability : float, optional
-            The probability that self particular situation happens
-        index : int, optional
-            The index in the list of bleeds we're current at
-            If equal to the length, it instead adds up damage and also caches for the next tick
-        '''
-        if active is None:
-            active = []
-
-        # remove bleeds that expire at self index
-        for bleed in active:
-            if bleed.end_index is not None and index > bleed.end_index:
-                active.remove(bleed)
-
-        # we're past the last bleed; time to add up
-        if index == len(bleeds):
-            total = 0.0
+    @staticmethod
+    def merge(states, active, probability):
+        try:
+            states[active] += probability
+        except KeyError:
+            states[active] = probability
+
+    def sum_bleeds(self):
+        ''' Calculates the total damage from bleed during the current tick '''
+        total = 0
+        for active, probability in self._static['states'].items():
             stacks = len(active)
-            cache = self._static['cache']
-
-            # find if a currently cached call has the same set of active bleed stacks
-            # if so just add to its probability instead of adding more cached calls
-            equivalents = list(filter(lambda p: p.keywords['active'] == active, cache))
-            if equivalents:
-                equivalents[0].keywords['probability'] += probability
-            else:
-                self._static['cache'].append(partial(self.sum_bleeds, active=active, probability=probability, index=index))
-
+            if stacks == 0:
+                continue
+            dmg = 0.0
             for bleed in active:
-                total += bleed.quickshot_event.dmg
-
+                dmg += bleed.quickshot_event.dmg
             if stacks == 3:
-                return total * 2 * probability
+                total += dmg * 2 * probability
             elif stacks == 2:
-                return total * 1.5 * probability
-            elif stacks == 1:
-                return total * probability
+                total += dmg * 1.5 * probability
             else:
-                return 0
-
-        if len(active) < 3:
-            # still have room for another stack
-            # add the damages from having it whiff and proc
-            current = bleeds[index]
-            return self.sum_bleeds(bleeds, active + [current], probability * current.chance, index + 1) + \
-                   self.sum_bleeds(bleeds, active, probability * (1.0 - current.chance), index + 1)
-        else:
-            # stacks saturated, guaranteed whiff
-            return self.sum_bleeds(bleeds, active, probability, index + 1)
-
+                total += dmg * probability
+        return total
 
-    def tick_proc(self, e):
+    def tick_proc(self):
         stacks = self._static['stacks']
-        cache = self._static['cache']
-        self._static['cache'] = []
-        bleeds = self._static['all_bleeds']
-
-        dmg = 0
-        if cache:
-            for cached in cache:
-                dmg += cached(bleeds)
-        else:
-            dmg = self.sum_bleeds(bleeds)
-
-        self.true_dmg_event.comment = '%d active stacks'%stacks
+        dmg = self.sum_bleeds()
+
+        if log_enabled():
+            self.true_dmg_event.comment = '%d active stacks'%stacks
         self.true_dmg_event.count = dmg
         self.true_dmg_event.on()
         # log('dmg','o_bleed',dmg,'%d stacks'%stacks)
-        # e.timing += self.iv
+        self.ticks.schedule(self.tick_proc, self.iv)
 
     def on(self):
         duration = self.duration*self.debufftime
-        log('debuff','bleed', f'<{duration:.02f}>')
+        if log_enabled():
+            log('debuff','bleed', f'<{duration:.02f}>')
         self.quickshot_event()
-        self._static['all_bleeds'].append(self)
         self.dot_end_timer.on(duration)
 
+        states = {}
+        for active, probability in self._static['states'].items():
+            if len(active) < 3:
+                # still have room for another stack, either it procs or whiffs
+                if self.chance > 0:
+                    self.merge(states, active + (self,), probability * self.chance)
+                if self.chance < 1:
+                    self.merge(states, active, probability * (1.0 - self.chance))
+            else:
+                # stacks saturated, guaranteed whiff
+                self.merge(states, active, probability)
+        self._static['states'] = states
+
         if self._static['stacks'] == 0:
-            self._static['tick_event'] = Timer(self.tick_proc, self.iv, True).on()
+            self._static['tick_event'] = self.tick_proc
+            self.ticks.schedule(self.tick_proc, self.iv)
 
         self._static['stacks'] += 1
 
     def dot_end_proc(self, e):
-        # can't remove self in order to build a more accurate picture
-        length = len(self._static['all_bleeds'])
+        states = {}
+        for active, probability in self._static['states'].items():
+            if self in active:
+                active = tuple(bleed for bleed in active if bleed is not self)
+            self.merge(states, active, probability)
+        self._static['states'] = states
 
-        # the index of the last element of the bleed list when self expires
-        # any future bleeds (ones with index strictly greater than self)
-        # will not be directly blocked by self bleed
-        self.end_index = length-1
         self._static['stacks'] -= 1
-        log('debuff', 'bleed', 'stack_end', 'stack <%d>' % self._static['stacks'])
+        if log_enabled():
+            log('debuff', 'bleed', 'stack_end', 'stack <%d>' % self._static['stacks'])
         if self._static['stacks'] < 0:
             print('err in bleed dot_end_proc')
             exit()
 
     def reset(self):
-        self._static['all_bleeds'] = []
         self._static['stacks'] = 0
-        self._static['cache'] = []
+        self._static['states'] = {(): 1.0}
         return self
@@ -32,24 +32,27 @@ class Tension:
         self.has_stack.on()
         if self.stack >= self.MAX_STACK:
             self.stack = self.MAX_STACK
-        log(self.name, '+{}'.format(n), 'stack <{}>'.format(int(self.stack)))
+        if log_enabled():
+            log(self.name, '+{}'.format(n), 'stack <{}>'.format(int(self.stack)))
 
         self.add_event.stack = self.stack
         self.add_event.on()
 
     def add_extra(self, n, team=False):
-        if team:
+        if team and log_enabled():
             log('{}_extra'.format(self.name), 'team', n)
         if self.stack == self.MAX_STACK:
             return
         self.stack += n
         if self.stack >= self.MAX_STACK:
             self.stack = self.MAX_STACK
-        log('{}_extra'.format(self.name), '+{}'.format(n), 'stack <{}>'.format(int(self.stack)))
+        if log_enabled():
+            log('{}_extra'.format(self.name), '+{}'.format(n), 'stack <{}>'.format(int(self.stack)))
 
     def on(self, e):
         if self.stack >= self.MAX_STACK and (e.name in self.modifier._static.damage_sources or e.name in self.extra_tensionable):
-            log(self.name, 'active', 'stack <{}>'.format(int(self.stack)))
+            if log_enabled():
+                log(self.name, 'active', 'stack <{}>'.format(int(self.stack)))
             self.active.add(e.name)
     
     def off(self, e):
@@ -57,7 +60,8 @@ class Tension:
             self.active.discard(e.name)
             self.has_stack.off()
             self.stack = 0
-            log(self.name, 'reset', 'stack <{}>'.format(int(self.stack)))
+            if log_enabled():
+                log(self.name, 'reset', 'stack <{}>'.format(int(self.stack)))
             self.end_event.on()
             if self.queued_stack:
                 self.add(n=self.queued_stack)
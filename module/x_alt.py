@@ -1,6 +1,6 @@
 from core.advbase import Fs_group, Fs, X, Event
 from core.timeline import Listener, Timer, now
-from core.log import log
+from core.log import log, log_enabled
 from core.config import Conf
 from core.dragonform import DragonForm
 import re
@@ -153,7 +153,8 @@ class X_alt:
         return False
 
     def on_t(self, t):
-        log('debug', '{} x_alt on'.format(self.name))
+        if log_enabled():
+            log('debug', '{} x_alt on'.format(self.name))
         self.active = True
         self.adv.x = self.x_alt
         if self.l_x_alt:
@@ -187,7 +188,8 @@ class X_alt:
                 
     def off(self):
         if self.active:
-            log('debug', '{} x_alt off'.format(self.name))
+            if log_enabled():
+                log('debug', '{} x_alt off'.format(self.name))
             self.active = False
             self.adv.x = self.x_og
             if self.l_x_alt:
@@ -204,7 +206,8 @@ class X_alt:
 
     def switch_t(self, t):
         prev_x = t.prev_x_alt
-        log('debug', '{} x_alt off'.format(prev_x.name))
+        if log_enabled():
+            log('debug', '{} x_alt off'.format(prev_x.name))
         if prev_x.active:
             doing = prev_x.a_x_alt[1]._static.doing
             prev_x.zeroed = (doing, doing.index)
@@ -218,7 +221,8 @@ class X_alt:
             if prev_x.no_dodge:
                 prev_x.adv.dodge = prev_x.dodge_og
         
-        log('debug', '{} x_alt on'.format(self.name))
+        if log_enabled():
+            log('debug', '{} x_alt on'.format(self.name))
         self.active = True
         self.adv.x = self.x_alt
         if self.l_x_alt:
@@ -0,0 +1,61 @@
+import os
+import json
+import subprocess
+import sys
+
+import core.acl
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ACL = '''
+`dragon(c3-s-end), s=1
+`s3, not buff(s3)
+`s1
+`s2, x=5
+`fs, x=5
+'''
+
+# builds ACL in a fresh process, with lark's parse replaced when it must not be called
+BUILD = '''
+import json, sys
+import core.acl
+core.acl.set_disk_cache(sys.argv[1])
+if sys.argv[2] == 'noparse':
+    def parse(*args, **kwargs):
+        raise AssertionError('parsed instead of loading from disk')
+    core.acl.PARSER.parse = parse
+core.acl.build_acl(sys.argv[3])
+print(json.dumps(core.acl.acl_cache_info()))
+'''
+
+
+def build_in_process(cache_dir, mode):
+    out = subprocess.run(
+        [sys.executable, '-c', BUILD, cache_dir, mode, ACL],
+        capture_output=True, text=True, cwd=ROOT, check=True
+    )
+    return json.loads(out.stdout)
+
+
+def test_second_process_loads_from_disk(tmp_path):
+    cache_dir = str(tmp_path / 'acl')
+    first = build_in_process(cache_dir, 'parse')
+    assert (first['disk_hits'], first['disk_misses']) == (0, 1)
+    assert len(os.listdir(cache_dir)) == 1
+    second = build_in_process(cache_dir, 'noparse')
+    assert (second['disk_hits'], second['disk_misses']) == (1, 0)
+
+
+def test_mass_pool_workers_use_disk_cache(tmp_path, monkeypatch):
+    import core.simulate
+    monkeypatch.setattr(core.acl, 'ACL_CACHE_DIR', str(tmp_path / 'acl'))
+    core.simulate.close_mass_pool()
+    try:
+        workers = core.simulate.mass_pool().apply(_worker_cache_dir)
+    finally:
+        core.simulate.close_mass_pool()
+    assert workers == str(tmp_path / 'acl')
+
+
+def _worker_cache_dir():
+    return core.acl.DISK_CACHE_DIR
@@ -0,0 +1,73 @@
+import json
+import os
+import random
+from collections import Counter
+
+import pytest
+
+from core.simulate import act_repeats
+
+DATA = os.path.join(os.path.dirname(__file__), 'data', 'act_sequences.json')
+
+
+def act_repeats_nested(condensed):
+    # the original nested loop implementation, kept as the reference
+    condensed = list(filter(lambda a: a[0] != 'dshift', condensed))
+    start = 0
+    maxlen = len(condensed)
+    bestest = condensed, 1, 0
+    for start in range(0, maxlen):
+        accumulator = Counter()
+        length = 1
+        c_slice = tuple(condensed[start:start+length])
+        while start+length*(accumulator[c_slice]+1) <= maxlen:
+            n_slice = tuple(condensed[start+length*accumulator[c_slice]:start+length*(accumulator[c_slice]+1)])
+            if n_slice == c_slice:
+                accumulator[c_slice] += 1
+            else:
+                length += 1
+                c_slice = tuple(condensed[start:start+length])
+                accumulator[c_slice] = 1
+        c_best = accumulator.most_common(1)
+        if len(c_best) > 0 and c_best[0][1] > bestest[1]:
+            bestest = (*c_best[0], start)
+    return bestest
+
+
+def recorded_sequences():
+    # condensed action logs of every adv at 180s and 600s
+    with open(DATA) as f:
+        return [[tuple(a) for a in seq] for seq in json.load(f)]
+
+
+def synthetic_sequences(count=2000, seed=5):
+    # noisy repeats of short rotations, with dshift that act_repeats drops
+    rnd = random.Random(seed)
+    sequences = []
+    for _ in range(count):
+        n = rnd.randint(0, 40)
+        k = rnd.randint(1, 4)
+        base = [(rnd.choice('xyzd') + str(rnd.randint(1, k)), rnd.randint(1, 2)) for _ in range(rnd.randint(1, 6))]
+        seq = []
+        while len(seq) < n:
+            if rnd.random() < 0.7:
+                seq += base
+            else:
+                seq.append((rnd.choice(['x1', 'fs', 's1', 'dshift']), 1))
+        sequences.append(seq[:n])
+    return sequences
+
+
+def normalized(result):
+    seq, freq, start = result
+    return tuple(seq), freq, start
+
+
+@pytest.mark.parametrize('seq', recorded_sequences())
+def test_recorded(seq):
+    assert normalized(act_repeats(seq)) == normalized(act_repeats_nested(seq))
+
+
+def test_synthetic():
+    for seq in synthetic_sequences():
+        assert normalized(act_repeats(seq)) == normalized(act_repeats_nested(seq)), seq
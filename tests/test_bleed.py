@@ -0,0 +1,130 @@
+import pytest
+
+import core.simulate
+from module.bleed import mBleed
+
+
+class RecursiveBleeds(object):
+    """
+    The recursive mBleed.sum_bleeds this module used to run every tick, computed from
+    scratch: every applied bleed in order, each either procs or whiffs (always whiffs
+    at 3 stacks), with expired ones dropped once a later bleed is applied.
+    The one change is that expired bleeds are filtered instead of removed from the
+    list being iterated, which skipped back to back expiries.
+    """
+    def __init__(self):
+        self.bleeds = []
+        self.end_index = {}
+
+    def on(self, bleed):
+        self.bleeds.append(bleed)
+
+    def end(self, bleed):
+        self.end_index[bleed] = len(self.bleeds) - 1
+
+    def sum_bleeds(self, active=(), probability=1.0, index=0):
+        active = [bleed for bleed in active if not index > self.end_index.get(bleed, index)]
+        if index == len(self.bleeds):
+            total = 0.0
+            for bleed in active:
+                total += bleed.quickshot_event.dmg
+            stacks = len(active)
+            if stacks == 3:
+                return total * 2 * probability
+            elif stacks == 2:
+                return total * 1.5 * probability
+            elif stacks == 1:
+                return total * probability
+            return 0
+        current = self.bleeds[index]
+        if len(active) < 3:
+            return self.sum_bleeds(active + [current], probability * current.chance, index + 1) + \
+                   self.sum_bleeds(active, probability * (1.0 - current.chance), index + 1)
+        return self.sum_bleeds(active, probability, index + 1)
+
+
+@pytest.fixture
+def bleeds():
+    # a real adv context, so bleeds get their damage from dmg_formula
+    adv_module, name = core.simulate.load_adv_module('Patia')
+    adv, _ = core.simulate.run_once(name, adv_module, {}, 10, True)
+    adv.ctx.on()
+    mBleed('init', 1.32).reset()
+    ref = RecursiveBleeds()
+    applied = []
+    def on(coef, chance):
+        bleed = mBleed(f's{len(applied)}', coef, chance=chance)
+        bleed.on()
+        ref.on(bleed)
+        applied.append(bleed)
+        check()
+        return bleed
+    def end(bleed):
+        bleed.dot_end_proc(None)
+        ref.end(bleed)
+        check()
+    def check():
+        assert applied[-1].sum_bleeds() == pytest.approx(ref.sum_bleeds(), rel=1e-12, abs=1e-9)
+    return on, end
+
+
+def test_chance_below_one(bleeds):
+    on, end = bleeds
+    for chance in (0.8, 0.5, 0.3, 0.65):
+        on(1.32, chance)
+
+
+def test_saturation(bleeds):
+    on, end = bleeds
+    # sure procs fill the 3 stacks, later ones can only whiff
+    for _ in range(3):
+        on(1.46, 1.0)
+    on(1.46, 1.0)
+    on(1.32, 0.8)
+
+
+def test_saturation_with_chance(bleeds):
+    on, end = bleeds
+    for coef, chance in ((1.32, 0.8), (1.46, 0.9), (1.32, 0.8), (1.46, 0.7), (1.32, 0.8), (1.46, 0.9)):
+        on(coef, chance)
+
+
+def test_stack_expiry(bleeds):
+    on, end = bleeds
+    first = on(1.32, 0.8)
+    second = on(1.46, 0.5)
+    third = on(1.32, 0.8)
+    on(1.46, 0.9)
+    end(first)
+    fifth = on(1.32, 0.8)
+    # back to back expiries
+    end(second)
+    end(third)
+    on(1.46, 0.6)
+    end(fifth)
+    on(1.32, 1.0)
+
+
+def test_adv_ticks(monkeypatch):
+    # every tick of a full run against the recursive sum over what happened so far
+    ref = RecursiveBleeds()
+    ticks = []
+    on, dot_end_proc, tick_proc = mBleed.on, mBleed.dot_end_proc, mBleed.tick_proc
+    def checked_on(self):
+        if self.name != 'init':
+            ref.on(self)
+        return on(self)
+    def checked_end(self, e):
+        ref.end(self)
+        return dot_end_proc(self, e)
+    def checked_tick(self):
+        ticks.append((self.sum_bleeds(), ref.sum_bleeds()))
+        return tick_proc(self)
+    monkeypatch.setattr(mBleed, 'on', checked_on)
+    monkeypatch.setattr(mBleed, 'dot_end_proc', checked_end)
+    monkeypatch.setattr(mBleed, 'tick_proc', checked_tick)
+    adv_module, name = core.simulate.load_adv_module('Patia')
+    core.simulate.run_once(name, adv_module, {}, 180, True)
+    assert ticks
+    for new, old in ticks:
+        assert new == pytest.approx(old, rel=1e-12, abs=1e-9)
@@ -0,0 +1,13 @@
+import pytest
+
+from core.modifier import Modifier, ModifierDict
+
+
+def test_append_twice():
+    mods = ModifierDict()
+    mod = Modifier('a', 'att', 'passive', 0.1)
+    mod.off()
+    mods.append(mod)
+    with pytest.raises(ValueError):
+        mods.append(mod)
+    assert mods.mod('att') == pytest.approx(1.1)
@@ -0,0 +1,15 @@
+import io
+
+import core.simulate
+from core.timeline import TimelineProfiler
+
+
+def test_profile_counts_event_fires():
+    module, name = core.simulate.load_adv_module('Sylas')
+    profiler = TimelineProfiler()
+    core.simulate.run_once(name, module, {}, 30, True, profiler=profiler)
+    assert profiler.fires['dmg_formula'] > 0
+    assert profiler.to_dict()['fires'] == profiler.fires
+    output = io.StringIO()
+    profiler.report(output)
+    assert 'event fires' in output.getvalue()
@@ -0,0 +1,91 @@
+import pytest
+
+import core.simulate
+from core.modifier import Modifier, KillerModifier
+
+RATE_LISTS = (
+    [],
+    [('poison', 0.5)],
+    [('poison', 1.0), ('burn', 0.3)],
+    [('poison', 0.2), ('debuff_def', 0.7), ('paralysis', 0.9)],
+    [('burn', 0.25), ('poison', 0.6), ('debuff', 0.35), ('debuff_def', 0.1)],
+)
+
+
+@pytest.fixture
+def adv():
+    module, name = core.simulate.load_adv_module('Sylas')
+    adv, _ = core.simulate.run_once(name, module, {}, 60, True)
+    adv.ctx.on()
+    adv.rate_memo.clear()
+    return adv
+
+
+def crit_brute(adv, rate_list, initial):
+    return adv.crit_rates(rate_list, dict(initial))
+
+
+def crit_memo(adv, rate_list, initial):
+    return adv.memo_rates('crit', rate_list, dict(initial), adv.crit_rates)
+
+
+def killer_brute(adv, rate_list, total):
+    return adv.killer_rates(rate_list, total)
+
+
+def killer_memo(adv, rate_list, total):
+    return adv.memo_rates('killer', rate_list, total, adv.killer_rates)
+
+
+def assert_memo_matches(adv):
+    for rate_list in RATE_LISTS:
+        for _ in range(2):
+            # second pass is served from the memo
+            assert crit_memo(adv, rate_list, {'chance': 0.1, 'damage': 0.2}) == crit_brute(adv, rate_list, {'chance': 0.1, 'damage': 0.2})
+            assert killer_memo(adv, rate_list, 0.15) == killer_brute(adv, rate_list, 0.15)
+
+
+def test_memo_rates_matches_enumeration(adv):
+    mods = [
+        KillerModifier('t_poison', 'hit', 0.2, ['poison']),
+        KillerModifier('t_burn', 'passive', 0.1, ['burn', 'paralysis']),
+        KillerModifier('t_def', 'hit', 0.05, ['debuff_def']),
+        Modifier('t_poison_cc', 'poison_crit', 'chance', 0.1),
+        Modifier('t_poison_cd', 'poison_crit', 'damage', 0.3),
+        Modifier('t_debuff_cc', 'debuff_crit', 'chance', 0.05),
+    ]
+    assert_memo_matches(adv)
+    for mod in mods:
+        mod.off()
+
+
+def test_memo_rates_follows_modifier_changes(adv):
+    killer = KillerModifier('t_poison', 'hit', 0.2, ['poison'])
+    crit = Modifier('t_poison_cc', 'poison_crit', 'chance', 0.1)
+    assert_memo_matches(adv)
+
+    # same modifiers with new values
+    killer.mod_value = 0.4
+    crit.mod_value = 0.25
+    assert_memo_matches(adv)
+
+    # modifiers going off and on
+    killer.off()
+    assert_memo_matches(adv)
+    killer.on()
+    crit.off()
+    assert_memo_matches(adv)
+
+    # dynamic values, evaluated on every call
+    stacks = [1]
+    dynamic = Modifier('t_burn_dyn', 'burn_killer', 'hit', 0, get=lambda: 0.1 * stacks[0])
+    assert_memo_matches(adv)
+    stacks[0] = 3
+    assert_memo_matches(adv)
+
+    # a new modifier in an order that was already summed
+    extra = Modifier('t_poison_cc2', 'poison_crit', 'chance', 0.07)
+    assert_memo_matches(adv)
+
+    for mod in (killer, dynamic, extra):
+        mod.off()
@@ -0,0 +1,27 @@
+import sys
+
+import pytest
+
+import core.simulate
+from core.log import Log
+
+
+@pytest.mark.parametrize('name', ('Sylas', 'Grace', 'Gala_Alex', 'Patia'))
+def test_hits_carry_interned_source(name, monkeypatch):
+    module, name = core.simulate.load_adv_module(name)
+    adv = module(name=name, duration=60)
+    callers = []
+    source = Log.source
+    def traced_source(self, name):
+        callers.append(sys._getframe(1).f_code.co_name)
+        return source(self, name)
+    monkeypatch.setattr(Log, 'source', traced_source)
+    ticks = []
+    l_true_dmg = adv.l_true_dmg
+    adv.l_true_dmg = lambda e: ticks.append(e) or l_true_dmg(e)
+    adv.run()
+    assert sum(adv.logs.damage['x'].values()) > 0
+    # hits are interned when their attrs are compiled, ticks on first use
+    assert 'dmg_make' not in callers
+    assert callers.count('hitattr_make') <= 1
+    assert callers.count('l_true_dmg') <= len(set(map(id, ticks)))
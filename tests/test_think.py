@@ -0,0 +1,38 @@
+import pytest
+
+import core.simulate
+from core.advbase import ThinkTimer
+
+
+@pytest.fixture
+def adv():
+    module, name = core.simulate.load_adv_module('Sylas')
+    adv, _ = core.simulate.run_once(name, module, {}, 10, True)
+    adv.ctx.on()
+    adv.ctx.stop = 0
+    adv.ctx.timeline.end = float('inf')
+    return adv
+
+
+def merged(adv, *pins):
+    t = ThinkTimer.get(adv.cb_think_pins)
+    t.pins = [(pin, 'x1', 0, 1, 0) for pin in pins]
+    return t
+
+
+def test_merged_pins_all_run(adv):
+    seen = []
+    adv.cb_think = lambda t: seen.append(t.pin)
+    adv.cb_think_pins(merged(adv, 'x1', 's1', 'fs'))
+    assert seen == ['x1', 's1', 'fs']
+
+
+def test_merged_pin_stops_run(adv):
+    seen = []
+    def think(t):
+        seen.append(t.pin)
+        if t.pin == 's1':
+            adv.ctx.timeline._stop()
+    adv.cb_think = think
+    adv.cb_think_pins(merged(adv, 'x1', 's1', 'fs'))
+    assert seen == ['x1', 's1']
@@ -0,0 +1,15 @@
+from core.ctx import SimContext
+from core.timeline import Timeline, Timer
+
+
+def test_group_fires_before_timer_pushed_between():
+    ctx = SimContext().on()
+    order = []
+    ctx.ticks.schedule(lambda: order.append('dot1'), 1.0)
+    Timer(lambda t: order.append('timer')).on(1.0)
+    ctx.ticks.schedule(lambda: order.append('dot2'), 1.0)
+    Timer(lambda t: order.append('later')).on(1.5)
+    Timeline.run(10)
+    # separate timers would run dot1, timer, dot2
+    assert order == ['dot1', 'dot2', 'timer', 'later']
+    assert not ctx.ticks.groups and not ctx.ticks.pending
@@ -0,0 +1,26 @@
+from core.ctx import SimContext
+from core.timeline import Timeline
+from core.advbase import Action, HitTimer
+
+
+def test_hit_cancels_own_action():
+    SimContext().on()
+    action = Action('x1')
+    seen = []
+
+    def hit(t):
+        # a hit callback that cancels the action it belongs to, then schedules another hit
+        action.clear_delayed()
+        other = HitTimer.get(lambda t: None)
+        other.name = 'x2'
+        seen.append((other is t, t.name))
+
+    t = HitTimer.get(hit)
+    t.name = 'x1'
+    t.on(0.5)
+    action.add_delayed(t)
+    Timeline.run(10)
+
+    assert seen == [(False, 'x1')]
+    assert HitTimer.pool[-1] is t
+    assert not action.delayed